@@ -11,6 +11,12 @@ using System.Threading;
 using UnityEditor;
 #endif
 
+public enum FrameEncoding
+{
+    JPEG,
+    RawRGB
+}
+
 public class BitmapStreamer : MonoBehaviour
 {
     [Header("🎥 Stream Settings")]
@@ -31,6 +37,7 @@ public class BitmapStreamer : MonoBehaviour
     [Range(40, 90)]
     public int jpegQuality = 70;
     public bool useGZipCompression = false;
+    public FrameEncoding frameEncoding = FrameEncoding.JPEG;
     
     [Header("📊 Debug")]
     public bool showDebugInfo = true;
@@ -50,12 +57,15 @@ public class BitmapStreamer : MonoBehaviour
     // Performance optimized rendering
     private RenderTexture renderTexture;
     private Texture2D captureTexture;
+    private byte[] flipRowBuffer;
     private float frameInterval;
     private float lastFrameTime;
     
     // Latest frame for HTTP serving
     private byte[] latestFrameData;
     private float lastFrameTimestamp;
+    private string latestFrameEncoding = "jpeg";
+    private bool latestFrameGZipped = false;
     private readonly object frameLock = new object();
     
     // Tracking
@@ -241,8 +251,21 @@ public class BitmapStreamer : MonoBehaviour
         {
             if (latestFrameData != null && Time.time - lastFrameTimestamp < 5f)
             {
-                // Serve fresh frame
-                response.ContentType = "image/jpeg";
+                // Serve fresh frame, labelled with how it was actually encoded
+                if (latestFrameEncoding == "jpeg")
+                {
+                    response.ContentType = "image/jpeg";
+                }
+                else
+                {
+                    response.ContentType = "application/octet-stream";
+                    response.AddHeader("X-Frame-Encoding", latestFrameEncoding);
+                    response.AddHeader("X-Frame-Resolution", $"{streamWidth}x{streamHeight}");
+                }
+                if (latestFrameGZipped)
+                {
+                    response.AddHeader("Content-Encoding", "gzip");
+                }
                 response.StatusCode = 200;
                 response.ContentLength64 = latestFrameData.Length;
                 response.OutputStream.Write(latestFrameData, 0, latestFrameData.Length);
@@ -345,7 +368,7 @@ public class BitmapStreamer : MonoBehaviour
         isConnected = true;
         Debug.Log("Connected to bitmap server");
         
-        string json = $"{{\"type\":\"unity_bitmap_streamer\", \"version\":\"1.0\", \"capabilities\":{{\"resolution\":\"{streamWidth}x{streamHeight}\", \"fps\":{targetFPS}, \"compression\":\"{(useGZipCompression ? "gzip" : "none")}\"}}}}";
+        string json = $"{{\"type\":\"unity_bitmap_streamer\", \"version\":\"1.0\", \"capabilities\":{{\"resolution\":\"{streamWidth}x{streamHeight}\", \"fps\":{targetFPS}, \"compression\":\"{(useGZipCompression ? "gzip" : "none")}\", \"encoding\":\"{EncodingName()}\"}}}}";
         ws.SendText(json);
         
         Debug.Log($"Sent registration: {json}");
@@ -381,6 +404,15 @@ public class BitmapStreamer : MonoBehaviour
                 
                 Debug.Log($"✅ Registered as {clientId}, {connectedViewers} viewers connected");
             }
+            else if (response.type == "codec_advice")
+            {
+                // Server measured gzip ratio on our frames, follow its advice
+                if (response.compression == "none" && useGZipCompression)
+                {
+                    useGZipCompression = false;
+                    Debug.Log($"🗜 GZip disabled by server (ratio {response.ratio:F3})");
+                }
+            }
             else if (response.type == "client_count")
             {
                 connectedViewers = response.count;
@@ -429,7 +461,9 @@ public class BitmapStreamer : MonoBehaviour
         // Encode to JPEG
         if (captureTexture != null)
         {
-            imageData = captureTexture.EncodeToJPG(jpegQuality);
+            imageData = frameEncoding == FrameEncoding.RawRGB
+                ? FlipRowsToTopDown(captureTexture.GetRawTextureData(), streamWidth * 3, streamHeight)
+                : captureTexture.EncodeToJPG(jpegQuality);
             
             if (imageData != null)
             {
@@ -444,9 +478,11 @@ public class BitmapStreamer : MonoBehaviour
                 {
                     latestFrameData = imageData;
                     lastFrameTimestamp = Time.time;
+                    latestFrameEncoding = EncodingName();
+                    latestFrameGZipped = useGZipCompression;
                 }
                 
-                headerJson = $"{{\"type\":\"bitmap_frame\", \"frame_number\":{currentFrameNumber}, \"timestamp\":{Time.time}, \"resolution\":\"{streamWidth}x{streamHeight}\", \"compression\":\"{(useGZipCompression ? "gzip" : "none")}\", \"size\":{imageData.Length}}}";
+                headerJson = $"{{\"type\":\"bitmap_frame\", \"frame_number\":{currentFrameNumber}, \"timestamp\":{Time.time}, \"resolution\":\"{streamWidth}x{streamHeight}\", \"compression\":\"{(useGZipCompression ? "gzip" : "none")}\", \"encoding\":\"{EncodingName()}\", \"size\":{imageData.Length}}}";
                 
                 captureSuccessful = true;
             }
@@ -485,6 +521,27 @@ public class BitmapStreamer : MonoBehaviour
         }
     }
     
+    // GetRawTextureData is bottom row first, rgb24 frames are sent top row first like the JPEGs
+    byte[] FlipRowsToTopDown(byte[] data, int rowBytes, int rows)
+    {
+        if (flipRowBuffer == null || flipRowBuffer.Length != rowBytes)
+        {
+            flipRowBuffer = new byte[rowBytes];
+        }
+        for (int top = 0, bottom = rows - 1; top < bottom; top++, bottom--)
+        {
+            Buffer.BlockCopy(data, top * rowBytes, flipRowBuffer, 0, rowBytes);
+            Buffer.BlockCopy(data, bottom * rowBytes, data, top * rowBytes, rowBytes);
+            Buffer.BlockCopy(flipRowBuffer, 0, data, bottom * rowBytes, rowBytes);
+        }
+        return data;
+    }
+    
+    string EncodingName()
+    {
+        return frameEncoding == FrameEncoding.RawRGB ? "rgb24" : "jpeg";
+    }
+    
     void UpdateFPSCalculation()
     {
         frameCount++;
@@ -617,4 +674,6 @@ public class ServerResponse
     public int web_clients_count;
     public int count;
     public string message;
+    public string compression;
+    public float ratio;
 }
\ No newline at end of file
@@ -0,0 +1,172 @@
+using System;
+using System.Collections.Generic;
+using System.Net;
+using System.Net.Sockets;
+using System.Threading;
+using UnityEngine;
+
+/// <summary>
+/// Receives the multiplexed skeleton datagram (every camera in one packet per tick)
+/// on a single port and keeps the latest pose of each camera.
+/// Must match multi-camera-body-tracking/output_scheduler.py:
+///   header: magic 'GTMX', version, camera count, tick sequence, send timestamp
+///   per camera: camera id, flags, landmark count, sample timestamp, count * (x, y, z) float32
+/// </summary>
+class MultiplexedServerUDP
+{
+    const int HEADER_SIZE = 18;
+    const int ENTRY_SIZE = 12;
+    const byte VERSION = 1;
+    public const byte FLAG_VALID = 1;
+    public const byte FLAG_PREDICTED = 2;
+
+    public struct CameraPose
+    {
+        public uint tick;
+        public byte flags;
+        public double sampleTimestamp;
+        public Vector3[] landmarks;
+    }
+
+    // One receiver per port, shared by every PipeServer listening on it
+    static readonly Dictionary<int, MultiplexedServerUDP> instances = new Dictionary<int, MultiplexedServerUDP>();
+
+    public static MultiplexedServerUDP Get(int port)
+    {
+        lock (instances)
+        {
+            if (!instances.TryGetValue(port, out MultiplexedServerUDP server))
+            {
+                server = new MultiplexedServerUDP(port);
+                instances[port] = server;
+                server.StartListeningAsync();
+            }
+            server.users++;
+            return server;
+        }
+    }
+
+    UdpClient client;
+    IPEndPoint endPoint;
+    bool open;
+    int port;
+    int users;
+    readonly Dictionary<int, CameraPose> latest = new Dictionary<int, CameraPose>();
+
+    MultiplexedServerUDP(int port)
+    {
+        this.port = port;
+        client = new UdpClient(port, AddressFamily.InterNetwork);
+    }
+
+    void StartListeningAsync()
+    {
+        open = true;
+        Thread t = new Thread(new ThreadStart(Listen));
+        t.IsBackground = true;
+        t.Start();
+    }
+
+    void Listen()
+    {
+        Debug.Log("Waiting for multiplexed skeletons @Port:" + port);
+        while (open)
+        {
+            try
+            {
+                byte[] packet = client.Receive(ref endPoint);
+                Parse(packet);
+            }
+            catch (SocketException)
+            {
+                if (open)
+                    Thread.Sleep(100);
+            }
+            catch (ObjectDisposedException)
+            {
+                break;
+            }
+        }
+    }
+
+    void Parse(byte[] packet)
+    {
+        if (packet.Length < HEADER_SIZE || packet[0] != 'G' || packet[1] != 'T' || packet[2] != 'M' || packet[3] != 'X' || packet[4] != VERSION)
+            return;
+
+        int count = packet[5];
+        uint tick = BitConverter.ToUInt32(packet, 6);
+        int offset = HEADER_SIZE;
+
+        for (int c = 0; c < count && offset + ENTRY_SIZE <= packet.Length; ++c)
+        {
+            int cameraId = BitConverter.ToUInt16(packet, offset);
+            CameraPose pose = new CameraPose
+            {
+                tick = tick,
+                flags = packet[offset + 2],
+                sampleTimestamp = BitConverter.ToDouble(packet, offset + 4)
+            };
+            int landmarkCount = packet[offset + 3];
+            offset += ENTRY_SIZE;
+            if (offset + landmarkCount * 12 > packet.Length)
+                return;
+
+            pose.landmarks = new Vector3[landmarkCount];
+            for (int i = 0; i < landmarkCount; ++i, offset += 12)
+            {
+                pose.landmarks[i] = new Vector3(
+                    BitConverter.ToSingle(packet, offset),
+                    BitConverter.ToSingle(packet, offset + 4),
+                    BitConverter.ToSingle(packet, offset + 8));
+            }
+
+            lock (latest)
+            {
+                latest[cameraId] = pose;
+            }
+        }
+
+        // Wake every PipeServer waiting on this port
+        lock (latest)
+        {
+            Monitor.PulseAll(latest);
+        }
+    }
+
+    /// <summary>
+    /// Waits up to `timeoutMs` for a pose of the camera from a tick other than `afterTick`
+    /// (-1 before the first pose, so tick 0 counts).
+    /// </summary>
+    public bool WaitForPose(int cameraId, long afterTick, int timeoutMs, out CameraPose pose)
+    {
+        lock (latest)
+        {
+            while (!latest.TryGetValue(cameraId, out pose) || pose.tick == afterTick)
+            {
+                if (!open || !Monitor.Wait(latest, timeoutMs))
+                {
+                    pose = default(CameraPose);
+                    return false;
+                }
+            }
+            return true;
+        }
+    }
+
+    public void Release()
+    {
+        lock (instances)
+        {
+            if (--users > 0)
+                return;
+            instances.Remove(port);
+            open = false;
+            client.Close();
+        }
+        lock (latest)
+        {
+            Monitor.PulseAll(latest);
+        }
+    }
+}
@@ -17,6 +17,8 @@ public class PipeServer : MonoBehaviour
     public bool useLegacyPipes = false; // True to use NamedPipes for interprocess communication (not supported on Linux)
     public string host = "127.0.0.1"; // This machines host.
     public int port = 52733; // Must match the Python side.
+    public bool useMultiplexedPort = false; // True when Python sends all cameras to one port (MULTIPLEX_OUTPUT_PORT)
+    public int cameraId = 62700; // Camera input port to take from the multiplexed packet
     public Transform bodyParent;
     public GameObject landmarkPrefab;
     public GameObject linePrefab;
@@ -32,6 +34,7 @@ public class PipeServer : MonoBehaviour
     private NamedPipeServerStream serverNP;
     private BinaryReader reader;
     private ServerUDP server;
+    private MultiplexedServerUDP multiplexedServer;
 
     private Body body;
 
@@ -101,6 +104,12 @@ public class PipeServer : MonoBehaviour
     {
         System.Globalization.CultureInfo.CurrentCulture = System.Globalization.CultureInfo.InvariantCulture;
 
+        if (useMultiplexedPort)
+        {
+            RunMultiplexed();
+            return;
+        }
+
         if (useLegacyPipes)
         {
             // Open the named pipe.
@@ -163,10 +172,44 @@ public class PipeServer : MonoBehaviour
 
     }
 
+    private void RunMultiplexed()
+    {
+        multiplexedServer = MultiplexedServerUDP.Get(port);
+        print("Listening for camera " + cameraId + " @" + host + ":" + port + " (multiplexed)");
+
+        long lastTick = -1; // No pose yet, so the first tick (0) is not skipped
+        MultiplexedServerUDP receiver;
+        while ((receiver = multiplexedServer) != null)
+        {
+            MultiplexedServerUDP.CameraPose pose;
+            // Blocks until the receiver thread parses a new packet, no polling
+            if (!receiver.WaitForPose(cameraId, lastTick, MULTIPLEX_WAIT_MS, out pose))
+                continue;
+            lastTick = pose.tick;
+            if ((pose.flags & MultiplexedServerUDP.FLAG_VALID) == 0)
+                continue;
+
+            Body h = body;
+            for (int i = 0; i < pose.landmarks.Length && i < LANDMARK_COUNT; ++i)
+            {
+                h.positionsBuffer[i].value += pose.landmarks[i];
+                h.positionsBuffer[i].accumulatedValuesCount += 1;
+            }
+            h.active = true;
+        }
+    }
+
     private void OnDisable()
     {
         print("Client disconnected.");
-        if (useLegacyPipes)
+        if (useMultiplexedPort)
+        {
+            MultiplexedServerUDP released = multiplexedServer;
+            multiplexedServer = null;
+            if (released != null)
+                released.Release();
+        }
+        else if (useLegacyPipes)
         {
             serverNP.Close();
             serverNP.Dispose();
@@ -178,6 +221,7 @@ public class PipeServer : MonoBehaviour
     }
 
     const int LANDMARK_COUNT = 33;
+    const int MULTIPLEX_WAIT_MS = 100; // Wake up this often to notice OnDisable
     const int LINES_COUNT = 11;
 
     public struct AccumulatedBuffer
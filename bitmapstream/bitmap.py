@@ -1,14 +1,29 @@
 # ultra_optimized_bitmap_server.py - Maximum performance Unity bitmap streaming
 import asyncio
+import argparse
 import websockets
 import json
 import gzip
 import time
 import logging
+import struct
+from collections import deque
 from typing import Dict, Set, Optional
+import os
 import base64
 import traceback
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from transcoder import (
+    RENDITION_TIERS, SOURCE_TIER, AUTO_TIER, ViewerQuality,
+    transcoding_available, transcode_frame, rendition_size, get_tier
+)
+from frame_ring import META_KEYS
+from timeshift import TimeshiftStore, FrameRecorder
+from skeleton import (
+    SkeletonStream, LandmarkTapProtocol, parse_landmark_header, skeleton_stream_id,
+    SKELETON_STREAM_TIMEOUT
+)
+from metrics import ServerMetrics, serve_metrics
 
 # Optimized logging
 logging.basicConfig(
@@ -17,10 +32,133 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Codec negotiation - image encodings forwarded to viewers untouched
+PASSTHROUGH_ENCODINGS = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'rgb24': 'image/x-raw-rgb',  # Raw RGB24 pixels, top row first, viewers draw with resolution
+}
+SUPPORTED_COMPRESSIONS = ('none', 'gzip')
+DEFAULT_ENCODING = 'jpeg'
+
+# Gzip is only worth it if it saves at least this much (compressed/original ratio)
+MIN_USEFUL_COMPRESSION_RATIO = 0.95
+COMPRESSION_SAMPLE_FRAMES = 60  # Frames measured before advising Unity
+
+# Per-stream ingest pipeline
+INGEST_QUEUE_SIZE = 2  # Frames waiting for the ingest worker, oldest dropped beyond this
+BACKPRESSURE_TIMEOUT = 0.05  # Max time the read loop waits for the worker before dropping
+
+def encode_frame_message(message, data) -> str:
+    """Attach base64 frame data to a bitmap_frame message and serialize it
+
+    Runs in the thread pool as one step, so neither the base64 pass nor the
+    JSON dump of the (large) string touches the event loop.
+    """
+    message["data"] = base64.b64encode(data).decode('ascii')
+    message["size"] = len(data)
+    return json.dumps(message)
+
+def write_buffer_size(websocket) -> int:
+    """Bytes queued in a connection's transport, not yet handed to the network"""
+    transport = getattr(websocket, 'transport', None)
+    return transport.get_write_buffer_size() if transport else 0
+
+def gzip_original_size(data) -> Optional[int]:
+    """Read the uncompressed size from the gzip trailer (ISIZE) without decompressing"""
+    if len(data) < 18 or data[:2] != b'\x1f\x8b':
+        return None
+    return struct.unpack('<I', data[-4:])[0]
+
+class CompressionMonitor:
+    """Tracks gzip compression ratio of a Unity stream from the gzip trailers"""
+    def __init__(self, sample_frames=COMPRESSION_SAMPLE_FRAMES):
+        self.sample_frames = sample_frames
+        self.compressed_bytes = 0
+        self.original_bytes = 0
+        self.samples = 0
+        self.advised = False
+
+    def add(self, data) -> bool:
+        """Record a gzip frame, returns False if it is not valid gzip"""
+        original_size = gzip_original_size(data)
+        if not original_size:
+            return False
+        self.compressed_bytes += len(data)
+        self.original_bytes += original_size
+        self.samples += 1
+        return True
+
+    @property
+    def ratio(self) -> float:
+        if self.original_bytes == 0:
+            return 1.0
+        return self.compressed_bytes / self.original_bytes
+
+    def should_disable(self) -> bool:
+        """True once enough frames show gzip is not paying for itself"""
+        return (not self.advised and self.samples >= self.sample_frames
+                and self.ratio > MIN_USEFUL_COMPRESSION_RATIO)
+
+class IngestPipeline:
+    """Bounded, ordered, latest-wins hand-off from a Unity read loop to its ingest worker"""
+    def __init__(self, maxsize=INGEST_QUEUE_SIZE):
+        self.frames = deque()
+        self.maxsize = maxsize
+        self.available = asyncio.Event()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.last_frame_number = -1
+        self.superseded = 0
+        self.out_of_order = 0
+
+    def put(self, data, frame_header) -> int:
+        """Queue a frame and return how many frames were dropped (stale or superseded)"""
+        frame_number = frame_header.get('frame_number')
+        if frame_number is not None:  # Producers without frame numbers are taken in arrival order
+            if frame_number <= self.last_frame_number:
+                self.out_of_order += 1
+                return 1
+            self.last_frame_number = frame_number
+        
+        dropped = 0
+        if len(self.frames) >= self.maxsize:
+            self.frames.popleft()  # Latest wins
+            self.superseded += 1
+            dropped = 1
+        self.frames.append((data, frame_header))
+        self.available.set()
+        if len(self.frames) >= self.maxsize:
+            self.space.clear()
+        return dropped
+
+    async def get(self):
+        while not self.frames:
+            self.available.clear()
+            await self.available.wait()
+        frame = self.frames.popleft()
+        self.space.set()
+        return frame
+
+    async def wait_for_space(self, timeout=BACKPRESSURE_TIMEOUT) -> bool:
+        """Hold the read loop while the worker is behind, False if it stayed full"""
+        if self.space.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self.space.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
 class UltraOptimizedBitmapServer:
-    def __init__(self, host="127.0.0.1", port=52780):
+    def __init__(self, host="127.0.0.1", port=52780, gzip_passthrough=False,
+                 enable_transcoding=False, transcode_workers=2,
+                 timeshift_seconds=0, timeshift_dir="timeshift", record_dir=None,
+                 landmark_port=None, metrics_port=None):
         self.host = host
         self.port = port
+        # Forward gzip frames compressed instead of decompressing them here (viewers must gunzip)
+        self.gzip_passthrough = gzip_passthrough
         
         # Client tracking
         self.unity_clients: Dict[str, websockets.WebSocketServerProtocol] = {}
@@ -28,18 +166,63 @@ class UltraOptimizedBitmapServer:
         
         # Performance optimization - pre-allocate
         self.latest_frames = {}
+        self.unity_codecs: Dict[str, dict] = {}
+        self.compression_monitors: Dict[str, CompressionMonitor] = {}
+        self.broadcast_tasks: Dict[str, asyncio.Task] = {}
+        self.pending_broadcasts: Dict[str, tuple] = {}
+        # Transcoded tiers run beside the source broadcast: (stream, tier) -> task / newest waiting frame
+        self.rendition_tasks: Dict[tuple, asyncio.Task] = {}
+        self.pending_renditions: Dict[tuple, tuple] = {}
+        # One send in flight per viewer, plus its newest unsent frame per stream
+        self.viewer_sends: Dict[websockets.WebSocketServerProtocol, asyncio.Task] = {}
+        self.viewer_pending: Dict[websockets.WebSocketServerProtocol, Dict[str, tuple]] = {}
         self.client_counter = 0
         self.executor = ThreadPoolExecutor(max_workers=4)  # For CPU-intensive tasks
         
+        # Optional transcoding ladder - renditions only built for subscribed tiers
+        self.viewer_qualities: Dict[websockets.WebSocketServerProtocol, ViewerQuality] = {}
+        self.tier_frame_sizes: Dict[str, Dict[str, int]] = {}  # Per stream, tier -> last frame size
+        self.transcoder = None
+        if enable_transcoding:
+            if transcoding_available():
+                self.transcoder = ProcessPoolExecutor(max_workers=transcode_workers)
+            else:
+                logger.warning("⚠ Pillow not installed, transcoding ladder disabled")
+        
         # Statistics
         self.frames_received = 0
         self.frames_broadcasted = 0
         self.broadcast_errors = 0
         self.start_time = time.time()
         
-        # Performance tracking
+        # Performance tracking - constant-time counters and histograms
         self.last_fps_time = time.time()
-        self.recent_frames = []
+        self.metrics_port = metrics_port
+        self.metrics = ServerMetrics()
+        self.metrics.add_gauge("asyncio_tasks", lambda: len(asyncio.all_tasks()))
+        self.metrics.add_gauge("executor_queue_depth", lambda: self.executor._work_queue.qsize())
+        self.metrics.add_gauge("transcoder_pending",
+                               lambda: len(self.transcoder._pending_work_items) if self.transcoder else 0)
+        self.metrics.add_gauge("unity_clients", lambda: len(self.unity_clients))
+        self.metrics.add_gauge("web_clients", lambda: len(self.web_clients))
+        
+        # Time-shift buffer and recording (disabled when 0 / None)
+        self.timeshift_seconds = timeshift_seconds
+        self.timeshift_dir = timeshift_dir
+        self.record_dir = record_dir
+        self.timeshift_stores: Dict[str, TimeshiftStore] = {}
+        self.recorders: Dict[str, FrameRecorder] = {}
+        self.timeshift_viewers: Dict[websockets.WebSocketServerProtocol, asyncio.Task] = {}
+        
+        # Skeleton (landmark) streams - compact binary packets forwarded untouched
+        self.landmark_port = landmark_port
+        self.skeleton_streams: Dict[str, SkeletonStream] = {}
+        self.skeleton_subscriptions: Dict[websockets.WebSocketServerProtocol, Optional[Set[str]]] = {}
+        self.skeleton_only_viewers: Set[websockets.WebSocketServerProtocol] = set()
+        self.landmark_errors = 0
+        
+        # Extra websockets.serve options (e.g. reuse_port for fan-out workers)
+        self.serve_options = {}
 
     async def start_server(self):
         """Start the ultra-optimized bitmap WebSocket server"""
@@ -54,12 +237,12 @@ class UltraOptimizedBitmapServer:
                 ping_interval=30,
                 ping_timeout=15,
                 compression=None,  # Disable websocket compression for speed
-                max_queue=32  # Limit queue size for real-time performance
+                max_queue=32,  # Limit queue size for real-time performance
+                **self.serve_options
             ):
                 logger.info(f"📡 Ultra-Optimized Server ready on ws://{self.host}:{self.port}")
                 
-                # Start statistics task
-                asyncio.create_task(self.report_statistics())
+                self.start_background_tasks()
                 
                 # Keep server running
                 await asyncio.Future()
@@ -68,6 +251,34 @@ class UltraOptimizedBitmapServer:
             logger.error(f"❌ Failed to start server: {e}")
             raise
 
+    def start_background_tasks(self):
+        """Start long-running server tasks"""
+        asyncio.create_task(self.report_statistics())
+        asyncio.create_task(self.expire_skeleton_streams())
+        if self.landmark_port:
+            asyncio.create_task(self.start_landmark_tap())
+        if self.metrics_port:
+            asyncio.create_task(serve_metrics(self.metrics, self.host, self.metrics_port))
+
+    async def start_landmark_tap(self):
+        """Listen for landmark packets from the body tracking server over UDP"""
+        try:
+            await asyncio.get_event_loop().create_datagram_endpoint(
+                lambda: LandmarkTapProtocol(self.handle_landmark_packet),
+                local_addr=(self.host, self.landmark_port)
+            )
+            logger.info(f"🦴 Landmark tap listening on udp://{self.host}:{self.landmark_port}")
+        except Exception as e:
+            logger.error(f"❌ Failed to start landmark tap: {e}")
+
+    def get_stream_ids(self):
+        """Stream ids available to web viewers"""
+        return list(self.unity_clients.keys())
+
+    def get_web_client_count(self):
+        """Number of web viewers watching this server"""
+        return len(self.web_clients)
+
     async def handle_client(self, websocket, path=None):
         """Handle incoming WebSocket connections with optimized flow"""
         client_address = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
@@ -92,9 +303,12 @@ class UltraOptimizedBitmapServer:
                         await self.handle_unity_client(websocket, client_id)
                         
                 elif client_type in ['web_bitmap_viewer', 'web_client']:
-                    await self.register_web_client(websocket, client_address)
+                    await self.register_web_client(websocket, client_address, data)
                     await self.handle_web_client(websocket)
                     
+                elif client_type == 'landmark_streamer':
+                    await self.handle_landmark_client(websocket, client_address)
+                    
                 else:
                     logger.warning(f"⚠ Unknown client type: {client_type}")
                     await websocket.send(json.dumps({
@@ -119,12 +333,38 @@ class UltraOptimizedBitmapServer:
         
         self.unity_clients[client_id] = websocket
         
+        # Negotiate codec from Unity capabilities
+        capabilities = data.get('capabilities', {})
+        encoding = str(capabilities.get('encoding', DEFAULT_ENCODING)).lower()
+        compression = str(capabilities.get('compression', 'none')).lower()
+        if encoding not in PASSTHROUGH_ENCODINGS:
+            logger.warning(f"⚠ Unsupported encoding '{encoding}' from {client_id}, expecting {DEFAULT_ENCODING}")
+            encoding = DEFAULT_ENCODING
+        if compression not in SUPPORTED_COMPRESSIONS:
+            compression = 'none'
+        self.unity_codecs[client_id] = {'encoding': encoding, 'compression': compression}
+        self.compression_monitors[client_id] = CompressionMonitor()
+        
+        if self.timeshift_seconds > 0:
+            self.timeshift_stores[client_id] = TimeshiftStore(
+                os.path.join(self.timeshift_dir, client_id), retention_seconds=self.timeshift_seconds
+            )
+        if self.record_dir:
+            self.recorders[client_id] = FrameRecorder(self.record_dir, client_id)
+        
         response = {
             "type": "registration_confirmed",
             "client_id": client_id,
             "message": "Unity streamer registered",
-            "web_clients_count": len(self.web_clients),
+            "web_clients_count": self.get_web_client_count(),
             "target_fps": 45,
+            "codecs": {
+                "passthrough_encodings": list(PASSTHROUGH_ENCODINGS.keys()),
+                "compressions": list(SUPPORTED_COMPRESSIONS),
+                "gzip_passthrough": self.gzip_passthrough,
+                "encoding": encoding,
+                "compression": compression
+            },
             "timestamp": time.time()
         }
         
@@ -141,15 +381,32 @@ class UltraOptimizedBitmapServer:
             logger.error(f"❌ Failed to register Unity client: {e}")
             return None
 
-    async def register_web_client(self, websocket, address):
+    async def register_web_client(self, websocket, address, data=None):
         """Register web client with immediate response"""
+        quality = ViewerQuality()
+        if data and not quality.request(data.get('quality', AUTO_TIER)):
+            logger.warning(f"⚠ Unknown quality tier from {address}, using auto")
+        self.viewer_qualities[websocket] = quality
+        self.metrics.viewer(websocket, address)
+        if data:
+            if data.get('skeleton_only'):
+                self.skeleton_only_viewers.add(websocket)
+            if data.get('skeleton_streams') or data.get('skeleton_only'):
+                self.subscribe_skeleton(websocket, data.get('skeleton_streams', 'all'))
         self.web_clients.add(websocket)
         
         response = {
             "type": "registration_confirmed",
             "message": "Web viewer registered",
-            "available_streams": list(self.unity_clients.keys()),
-            "server_info": {"fps_target": 90},
+            "available_streams": self.get_stream_ids(),
+            "skeleton_streams": list(self.skeleton_streams.keys()),
+            "server_info": {
+                "fps_target": 90,
+                "data_types": list(PASSTHROUGH_ENCODINGS.values()),
+                "gzip_passthrough": self.gzip_passthrough,
+                "quality_tiers": [tier['name'] for tier in RENDITION_TIERS] if self.transcoder else [SOURCE_TIER],
+                "quality": quality.requested
+            },
             "timestamp": time.time()
         }
         
@@ -158,8 +415,9 @@ class UltraOptimizedBitmapServer:
             logger.info(f"🌐 Web client registered from {address} (total: {len(self.web_clients)})")
             
             # Send latest frame if available
-            if self.latest_frames:
+            if self.latest_frames and websocket not in self.skeleton_only_viewers:
                 await self.send_latest_frame_to_client(websocket)
+            self.send_latest_skeletons(websocket)
                 
             # Notify Unity clients
             await self.broadcast_client_count()
@@ -170,6 +428,8 @@ class UltraOptimizedBitmapServer:
     async def handle_unity_client(self, websocket, client_id):
         """Optimized Unity client handler with frame throttling"""
         logger.info(f"🎮 Unity handler started for {client_id}")
+        pipeline = IngestPipeline()
+        worker = asyncio.create_task(self.run_ingest_worker(client_id, pipeline))
         frame_count = 0
         expecting_frame_data = False
         current_frame_header = None
@@ -191,6 +451,7 @@ class UltraOptimizedBitmapServer:
                         if time_since_last < frame_interval:
                             # Skip this frame
                             expecting_frame_data = False
+                            self.metrics.frame_dropped(client_id)
                             continue
                         
                         current_frame_header = data
@@ -199,39 +460,56 @@ class UltraOptimizedBitmapServer:
                 elif isinstance(message, bytes):
                     # Binary frame data
                     if expecting_frame_data and current_frame_header:
-                        # Process frame immediately without blocking
-                        asyncio.create_task(self.process_frame_fast(
-                            message, current_frame_header, client_id
-                        ))
+                        current_frame_header['ingest_time'] = current_time
+                        
+                        # Hand off to the stream's ingest worker, in order, latest wins
+                        if pipeline.put(message, current_frame_header):
+                            self.metrics.frame_dropped(client_id)
                         
                         frame_count += 1
                         last_frame_time = current_time
                         
                         # Update FPS tracking
-                        self.recent_frames.append(current_time)
-                        # Keep only last 5 seconds of frames
-                        cutoff = current_time - 5.0
-                        self.recent_frames = [t for t in self.recent_frames if t > cutoff]
+                        self.metrics.frame_received(client_id, len(message), current_time)
                         
                         expecting_frame_data = False
                         current_frame_header = None
+                        
+                        # Backpressure - stop reading while the worker catches up
+                        await pipeline.wait_for_space()
                     
         except websockets.exceptions.ConnectionClosed:
             logger.info(f"🎮 Unity client {client_id} disconnected")
         except Exception as e:
             logger.error(f"❌ Unity client error {client_id}: {e}")
+        finally:
+            worker.cancel()
+            if pipeline.out_of_order:
+                logger.info(f"🎮 {client_id}: {pipeline.out_of_order} out-of-order frames dropped")
+
+    async def run_ingest_worker(self, client_id, pipeline):
+        """Process one stream's frames strictly in arrival order"""
+        while True:
+            data, frame_header = await pipeline.get()
+            await self.process_frame_fast(data, frame_header, client_id)
 
     async def process_frame_fast(self, data, frame_header, client_id):
         """Ultra-fast frame processing with minimal blocking"""
         try:
-            # Handle decompression in thread pool if needed
             compression = frame_header.get('compression', '').lower()
             if 'gzip' in compression:
-                processed_data = await asyncio.get_event_loop().run_in_executor(
-                    self.executor, gzip.decompress, data
-                )
+                await self.track_compression(client_id, data)
+                if self.gzip_passthrough:
+                    # Pass-through - viewers decompress, server never touches payload
+                    processed_data = data
+                else:
+                    processed_data = await asyncio.get_event_loop().run_in_executor(
+                        self.executor, gzip.decompress, data
+                    )
+                    compression = 'none'
             else:
                 processed_data = data
+                compression = 'none'
             
             # Store latest frame
             self.latest_frames[client_id] = {
@@ -239,92 +517,345 @@ class UltraOptimizedBitmapServer:
                 'data': processed_data,
                 'timestamp': time.time(),
                 'frame_number': frame_header.get('frame_number', 0),
-                'size': len(processed_data)
+                'size': len(processed_data),
+                'data_type': self.get_data_type(client_id, frame_header),
+                'compression': compression
             }
             
-            # Broadcast immediately if we have web clients
-            if self.web_clients:
-                # Don't await - fire and forget for maximum speed
-                asyncio.create_task(self.broadcast_frame_ultra_fast(
-                    client_id, frame_header, processed_data
-                ))
+            self.store_frame(client_id, frame_header, processed_data, compression)
+            self.publish_frame(client_id, frame_header, processed_data, compression)
             
             self.frames_received += 1
             
         except Exception as e:
             logger.error(f"❌ Frame processing error: {e}")
 
-    async def broadcast_frame_ultra_fast(self, client_id, frame_header, frame_data):
-        """Ultra-fast broadcasting with concurrent sends"""
+    def publish_frame(self, client_id, frame_header, frame_data, compression):
+        """Hand a processed frame to viewers"""
         if not self.web_clients:
             return
-            
+        
+        # One broadcast in flight per stream; a newer frame waits, latest wins
+        task = self.broadcast_tasks.get(client_id)
+        if task is not None and not task.done():
+            if client_id in self.pending_broadcasts:
+                self.metrics.frame_dropped(client_id)
+            self.pending_broadcasts[client_id] = (frame_header, frame_data, compression)
+            return
+        
+        self.broadcast_tasks[client_id] = asyncio.create_task(self.broadcast_stream(
+            client_id, frame_header, frame_data, compression
+        ))
+
+    async def broadcast_stream(self, client_id, frame_header, frame_data, compression):
+        """Broadcast a stream's frames one at a time, in order"""
+        while True:
+            await self.broadcast_frame_ultra_fast(client_id, frame_header, frame_data, compression)
+            pending = self.pending_broadcasts.pop(client_id, None)
+            if pending is None:
+                break
+            frame_header, frame_data, compression = pending
+        self.broadcast_tasks.pop(client_id, None)
+
+    def store_frame(self, client_id, frame_header, frame_data, compression):
+        """Keep the frame in the time-shift buffer and recording, if enabled"""
+        store = self.timeshift_stores.get(client_id)
+        recorder = self.recorders.get(client_id)
+        if store is None and recorder is None:
+            return
+        
+        header = {key: frame_header[key] for key in META_KEYS if key in frame_header}
+        header['data_type'] = self.get_data_type(client_id, frame_header)
+        header['compression'] = compression
+        stored_at = time.time()
         try:
-            # Convert to base64 in thread pool (CPU intensive)
-            base64_data = await asyncio.get_event_loop().run_in_executor(
-                self.executor, base64.b64encode, frame_data
-            )
-            base64_str = base64_data.decode('utf-8')
-            
-            # Create message
-            web_message = {
-                "type": "bitmap_frame",
-                "client_id": client_id,
-                "frame_number": frame_header.get('frame_number', 0),
-                "timestamp": frame_header.get('timestamp', time.time()),
-                "resolution": frame_header.get('resolution', '1280x720'),
-                "data": base64_str,
-                "data_type": "image/jpeg",
-                "size": len(frame_data)
-            }
-            
-            message_json = json.dumps(web_message)
-            
-            # Send to all web clients concurrently
-            send_tasks = []
-            for websocket in list(self.web_clients):  # Copy to avoid modification during iteration
-                task = asyncio.create_task(self.send_to_web_client_fast(websocket, message_json))
-                send_tasks.append(task)
-            
-            # Wait for all sends to complete with timeout
-            if send_tasks:
-                done, pending = await asyncio.wait(send_tasks, timeout=0.1)  # 100ms timeout
+            if store is not None:
+                store.append(frame_data, header, stored_at)
+            if recorder is not None:
+                recorder.write(frame_data, header, stored_at)
+        except Exception as e:
+            logger.error(f"❌ Time-shift store error {client_id}: {e}")
+
+    async def replay_timeshift(self, websocket, stream_id, seconds_ago):
+        """Play a stream to one viewer from `seconds_ago`, paced like the original, until go_live"""
+        store = self.timeshift_stores.get(stream_id)
+        if store is None:
+            await self.safe_send(websocket, json.dumps({
+                "type": "error",
+                "message": f"No time-shift buffer for {stream_id}"
+            }))
+            return
+        
+        seq = store.find_time(time.time() - seconds_ago)
+        replay_start = time.time()
+        first_stored_at = None
+        try:
+            while stream_id in self.timeshift_stores:
+                if seq >= store.tail_seq:
+                    await asyncio.sleep(0.005)  # Caught up with the newest frame
+                    continue
                 
-                # Cancel any pending sends
-                for task in pending:
-                    task.cancel()
+                frame = store.read(seq)
+                if frame is None:
+                    seq = store.head_seq  # Fell out of retention, resume from oldest
+                    continue
                 
-                # Count successes and failures
-                successful = 0
-                failed_clients = set()
+                header, data, stored_at = frame
+                if first_stored_at is None:
+                    first_stored_at = stored_at
                 
-                for task in done:
-                    try:
-                        result = await task
-                        if result:
-                            successful += 1
-                        else:
-                            failed_clients.add(task)
-                    except:
-                        failed_clients.add(task)
+                # Pace replay with original frame spacing
+                delay = (stored_at - first_stored_at) - (time.time() - replay_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
                 
-                self.frames_broadcasted += successful
+                base64_data = await asyncio.get_event_loop().run_in_executor(
+                    self.executor, base64.b64encode, data
+                )
+                message = {
+                    "type": "bitmap_frame",
+                    "client_id": stream_id,
+                    "frame_number": header.get('frame_number', 0),
+                    "timestamp": header.get('timestamp', stored_at),
+                    "resolution": header.get('resolution', '1280x720'),
+                    "data": base64_data.decode('utf-8'),
+                    "data_type": header.get('data_type', 'image/jpeg'),
+                    "compression": header.get('compression', 'none'),
+                    "timeshift_delay": time.time() - stored_at,
+                    "size": len(data)
+                }
+                await websocket.send(json.dumps(message))
+                seq += 1
                 
-                # Remove failed clients
-                if failed_clients:
-                    clients_to_remove = set()
-                    for task in failed_clients:
-                        # Find the websocket associated with this task
-                        # This is simplified - in practice you'd need better tracking
-                        pass
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.timeshift_viewers.pop(websocket, None)
+
+    async def start_timeshift(self, websocket, data):
+        """Switch a viewer from live to time-shifted playback"""
+        self.stop_timeshift(websocket)
+        stream_id = data.get('client_id') or (self.get_stream_ids() or [None])[0]
+        seconds_ago = max(0.0, min(float(data.get('seconds_ago', 10)), self.timeshift_seconds))
+        self.timeshift_viewers[websocket] = asyncio.create_task(
+            self.replay_timeshift(websocket, stream_id, seconds_ago)
+        )
+        logger.info(f"⏪ Web client time-shifted {seconds_ago:.1f}s on {stream_id}")
+
+    def stop_timeshift(self, websocket):
+        task = self.timeshift_viewers.pop(websocket, None)
+        if task:
+            task.cancel()
+
+    def get_encoding(self, client_id, frame_header):
+        """Frame encoding from the header, else the one negotiated at registration"""
+        encoding = frame_header.get('encoding')
+        if not encoding:
+            encoding = self.unity_codecs.get(client_id, {}).get('encoding', DEFAULT_ENCODING)
+        return str(encoding).lower()
+
+    def get_data_type(self, client_id, frame_header):
+        """Resolve viewer MIME type from frame header or negotiated encoding"""
+        encoding = self.get_encoding(client_id, frame_header)
+        return PASSTHROUGH_ENCODINGS.get(encoding, PASSTHROUGH_ENCODINGS[DEFAULT_ENCODING])
+
+    async def track_compression(self, client_id, data):
+        """Measure gzip ratio and tell Unity to turn gzip off when it is not worth it"""
+        monitor = self.compression_monitors.get(client_id)
+        if monitor is None or not monitor.add(data):
+            return
+        
+        if monitor.should_disable():
+            monitor.advised = True
+            websocket = self.unity_clients.get(client_id)
+            if websocket is None:
+                return
+            
+            message = {
+                "type": "codec_advice",
+                "compression": "none",
+                "ratio": round(monitor.ratio, 3),
+                "message": "gzip saves too little on encoded frames, disable it",
+                "timestamp": time.time()
+            }
+            await self.safe_send(websocket, json.dumps(message))
+            logger.info(f"🗜 Advised {client_id} to disable gzip (ratio {monitor.ratio:.3f})")
+
+    async def broadcast_frame_ultra_fast(self, client_id, frame_header, frame_data, compression='none'):
+        """Ultra-fast broadcasting with concurrent sends"""
+        if not self.web_clients:
+            return
+            
+        try:
+            data_type = self.get_data_type(client_id, frame_header)
+            self.tier_frame_sizes.setdefault(client_id, {})[SOURCE_TIER] = len(frame_data)
+            
+            # Group viewers so each rendition is built once and shared by its tier
+            viewers_by_tier = self.group_viewers_by_tier(client_id)
+            for tier_name, viewers in viewers_by_tier.items():
+                if tier_name != SOURCE_TIER:
+                    # Transcoded in its own task, the source tier never waits on a rendition
+                    self.publish_rendition(client_id, tier_name, frame_header, frame_data,
+                                           compression, data_type, viewers)
+            
+            source_viewers = viewers_by_tier.get(SOURCE_TIER)
+            if source_viewers:
+                resolution = frame_header.get('resolution', '1280x720')
+                await self.send_tier(client_id, SOURCE_TIER, frame_header,
+                                     (frame_data, data_type, resolution, compression), source_viewers)
             
         except Exception as e:
             logger.error(f"❌ Broadcast error: {e}")
 
-    async def send_to_web_client_fast(self, websocket, message):
+    def publish_rendition(self, client_id, tier_name, frame_header, frame_data, compression, data_type, viewers):
+        """One rendition build in flight per stream and tier; a newer frame replaces one still waiting"""
+        key = (client_id, tier_name)
+        frame = (frame_header, frame_data, compression, data_type, viewers)
+        task = self.rendition_tasks.get(key)
+        if task is not None and not task.done():
+            replaced = self.pending_renditions.get(key)
+            if replaced is not None:
+                for websocket in replaced[4]:
+                    self.metrics.viewer_dropped(websocket)
+            self.pending_renditions[key] = frame
+            return
+        
+        self.rendition_tasks[key] = asyncio.create_task(self.rendition_loop(key, frame))
+
+    async def rendition_loop(self, key, frame):
+        """Build and send a tier's renditions one at a time, then the newest frame that arrived meanwhile"""
+        client_id, tier_name = key
+        while frame is not None:
+            frame_header, frame_data, compression, data_type, viewers = frame
+            try:
+                rendition = await self.get_rendition(client_id, tier_name, frame_header, frame_data, compression, data_type)
+                await self.send_tier(client_id, tier_name, frame_header, rendition, viewers)
+            except Exception as e:
+                logger.error(f"❌ Rendition error ({tier_name}): {e}")
+            frame = self.pending_renditions.pop(key, None)
+        self.rendition_tasks.pop(key, None)
+
+    async def send_tier(self, client_id, tier_name, frame_header, rendition, viewers):
+        """Encode one rendition once and hand it to each of the tier's viewers"""
+        tier_data, tier_data_type, tier_resolution, tier_compression = rendition
+        
+        web_message = {
+            "type": "bitmap_frame",
+            "client_id": client_id,
+            "frame_number": frame_header.get('frame_number', 0),
+            "timestamp": frame_header.get('timestamp', time.time()),
+            "resolution": tier_resolution,
+            "data_type": tier_data_type,
+            "compression": tier_compression,
+            "quality": tier_name
+        }
+        
+        # Base64 + JSON in thread pool (CPU intensive)
+        message_json = await asyncio.get_event_loop().run_in_executor(
+            self.executor, encode_frame_message, web_message, tier_data
+        )
+        
+        # Hand off to each viewer's own send, the broadcast never waits on a viewer
+        ingest_time = frame_header.get('ingest_time')
+        for websocket in viewers:
+            if websocket in self.web_clients:  # May have left while the rendition was built
+                self.queue_viewer_send(websocket, message_json, client_id, ingest_time)
+
+    def group_viewers_by_tier(self, client_id):
+        """Map each subscribed rendition tier to its viewers, for one stream"""
+        viewers_by_tier = {}
+        tier_sizes = self.estimate_tier_sizes(client_id)
+        for websocket in list(self.web_clients):  # Copy to avoid modification during iteration
+            if websocket in self.timeshift_viewers or websocket in self.skeleton_only_viewers:
+                continue  # Served from the time-shift buffer or wants landmarks only
+            tier_name = SOURCE_TIER
+            quality = self.viewer_qualities.get(websocket)
+            if quality and self.transcoder:
+                tier_name = quality.select(tier_sizes)
+            viewers_by_tier.setdefault(tier_name, []).append(websocket)
+        return viewers_by_tier
+
+    def estimate_tier_sizes(self, client_id):
+        """Last measured frame size per tier of a stream, estimated from its source if not built yet"""
+        frame_sizes = self.tier_frame_sizes.get(client_id, {})
+        source_size = frame_sizes.get(SOURCE_TIER, 0)
+        return {
+            tier['name']: frame_sizes.get(tier['name'], int(source_size * tier['size_factor']))
+            for tier in RENDITION_TIERS
+        }
+
+    async def get_rendition(self, client_id, tier_name, frame_header, frame_data, compression, data_type):
+        """Return (data, data_type, resolution, compression) for a tier, source on fallback"""
+        resolution = frame_header.get('resolution', '1280x720')
+        source = (frame_data, data_type, resolution, compression)
+        
+        tier = get_tier(tier_name)
+        if tier_name == SOURCE_TIER or tier is None or self.transcoder is None:
+            return source
+        
+        size = rendition_size(resolution, tier)
+        if size is None:
+            return source
+        
+        encoding = self.get_encoding(client_id, frame_header)
+        try:
+            tier_data = await asyncio.get_event_loop().run_in_executor(
+                self.transcoder, transcode_frame, frame_data, compression, encoding,
+                resolution, size[0], size[1], tier['quality']
+            )
+        except Exception as e:
+            logger.error(f"❌ Transcode error ({tier_name}): {e}")
+            return source
+        
+        self.tier_frame_sizes.setdefault(client_id, {})[tier_name] = len(tier_data)
+        return tier_data, "image/jpeg", f"{size[0]}x{size[1]}", "none"
+
+    def queue_viewer_send(self, websocket, message, stream_id, ingest_time=None):
+        """Send a frame to one viewer, or hold it as that viewer's newest frame if a send is in flight"""
+        task = self.viewer_sends.get(websocket)
+        if task is not None and not task.done():
+            quality = self.viewer_qualities.get(websocket)
+            if quality:
+                quality.record_stall(time.perf_counter())  # Stalled viewers step down before the send ends
+            pending = self.viewer_pending.setdefault(websocket, {})
+            if stream_id in pending:
+                self.metrics.viewer_dropped(websocket)  # Latest wins, only this viewer misses it
+            pending[stream_id] = (message, ingest_time)
+            return
+        
+        self.viewer_sends[websocket] = asyncio.create_task(self.viewer_send_loop(
+            websocket, message, stream_id, ingest_time
+        ))
+
+    async def viewer_send_loop(self, websocket, message, stream_id, ingest_time):
+        """Send a viewer's frames one at a time, then whatever arrived for it meanwhile"""
+        while True:
+            if not await self.send_to_web_client_fast(websocket, message, stream_id, ingest_time):
+                self.viewer_pending.pop(websocket, None)
+                break
+            self.frames_broadcasted += 1
+            pending = self.viewer_pending.get(websocket)
+            if not pending:
+                break
+            stream_id = next(iter(pending))
+            message, ingest_time = pending.pop(stream_id)
+        self.viewer_sends.pop(websocket, None)
+
+    async def send_to_web_client_fast(self, websocket, message, stream_id=None, ingest_time=None):
         """Fast, non-blocking send to individual web client"""
         try:
+            quality = self.viewer_qualities.get(websocket)
+            buffered = write_buffer_size(websocket)
+            send_start = time.perf_counter()
+            if quality:
+                quality.start_send(len(message), send_start)
             await websocket.send(message)
+            send_end = time.perf_counter()
+            send_duration = send_end - send_start
+            if quality:
+                quality.finish_send(buffered + len(message) - write_buffer_size(websocket), send_end)
+            if websocket in self.web_clients:
+                self.metrics.frame_sent(websocket, stream_id, len(message), send_duration, ingest_time)
             return True
         except websockets.exceptions.ConnectionClosed:
             # Remove from web_clients
@@ -344,6 +875,19 @@ class UltraOptimizedBitmapServer:
                         data = json.loads(message)
                         if data.get('type') == 'request_frame':
                             await self.send_latest_frame_to_client(websocket)
+                        elif data.get('type') == 'select_quality':
+                            quality = self.viewer_qualities.get(websocket)
+                            if quality and quality.request(data.get('quality', AUTO_TIER)):
+                                logger.info(f"🎚 Web client quality set to {quality.requested}")
+                        elif data.get('type') == 'timeshift':
+                            await self.start_timeshift(websocket, data)
+                        elif data.get('type') == 'go_live':
+                            self.stop_timeshift(websocket)
+                        elif data.get('type') == 'stats':
+                            await websocket.send(json.dumps(dict(self.metrics.snapshot(), type="stats")))
+                        elif data.get('type') == 'subscribe_skeleton':
+                            self.subscribe_skeleton(websocket, data.get('streams', 'all'))
+                            self.send_latest_skeletons(websocket)
                     except:
                         pass  # Ignore malformed messages
                         
@@ -352,6 +896,71 @@ class UltraOptimizedBitmapServer:
         except Exception as e:
             logger.error(f"❌ Web client error: {e}")
 
+    async def handle_landmark_client(self, websocket, address):
+        """Landmark packets pushed over websocket instead of the UDP tap"""
+        logger.info(f"🦴 Landmark streamer connected from {address}")
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    self.handle_landmark_packet(message, address)
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"🦴 Landmark streamer {address} disconnected")
+
+    def handle_landmark_packet(self, packet, addr=None):
+        """Fan a landmark packet out to subscribed viewers as-is"""
+        header = parse_landmark_header(packet)
+        if header is None:
+            self.landmark_errors += 1
+            return
+        
+        camera_id, seq, _ = header
+        stream_id = skeleton_stream_id(camera_id)
+        stream = self.skeleton_streams.get(stream_id)
+        if stream is None:
+            stream = self.skeleton_streams[stream_id] = SkeletonStream(stream_id)
+            logger.info(f"🦴 Skeleton stream {stream_id} started")
+            asyncio.ensure_future(self.broadcast_stream_list())
+        
+        if not stream.accept(seq, packet, time.time()):
+            return
+        
+        targets = [
+            websocket for websocket, streams in self.skeleton_subscriptions.items()
+            if streams is None or stream_id in streams
+        ]
+        if targets:
+            # Small packets - write straight to every transport without per-viewer tasks
+            websockets.broadcast(targets, packet)
+
+    def subscribe_skeleton(self, websocket, streams):
+        """Subscribe a viewer to skeleton streams ('all', a list of ids, or empty to stop)"""
+        if streams == 'all':
+            self.skeleton_subscriptions[websocket] = None
+        elif streams:
+            self.skeleton_subscriptions[websocket] = set(streams)
+        else:
+            self.skeleton_subscriptions.pop(websocket, None)
+
+    def send_latest_skeletons(self, websocket):
+        if websocket not in self.skeleton_subscriptions:
+            return
+        streams = self.skeleton_subscriptions[websocket]
+        for stream_id, stream in self.skeleton_streams.items():
+            if stream.latest_packet and (streams is None or stream_id in streams):
+                websockets.broadcast([websocket], stream.latest_packet)
+
+    async def expire_skeleton_streams(self):
+        """Drop skeleton streams whose tracker went quiet"""
+        while True:
+            await asyncio.sleep(1.0)
+            cutoff = time.time() - SKELETON_STREAM_TIMEOUT
+            expired = [stream_id for stream_id, stream in self.skeleton_streams.items() if stream.last_seen < cutoff]
+            for stream_id in expired:
+                del self.skeleton_streams[stream_id]
+                logger.info(f"🦴 Skeleton stream {stream_id} expired")
+            if expired:
+                await self.broadcast_stream_list()
+
     async def send_latest_frame_to_client(self, websocket):
         """Send latest frame to specific client"""
         if not self.latest_frames:
@@ -375,7 +984,8 @@ class UltraOptimizedBitmapServer:
                 "timestamp": frame_info['timestamp'],
                 "resolution": frame_info['header'].get('resolution', '1280x720'),
                 "data": base64_data.decode('utf-8'),
-                "data_type": "image/jpeg",
+                "data_type": frame_info['data_type'],
+                "compression": frame_info['compression'],
                 "size": frame_info['size']
             }
             
@@ -391,7 +1001,7 @@ class UltraOptimizedBitmapServer:
             
         message = {
             "type": "client_count",
-            "count": len(self.web_clients),
+            "count": self.get_web_client_count(),
             "target_fps": 90,
             "timestamp": time.time()
         }
@@ -413,7 +1023,8 @@ class UltraOptimizedBitmapServer:
             
         message = {
             "type": "stream_list",
-            "streams": list(self.unity_clients.keys()),
+            "streams": self.get_stream_ids(),
+            "skeleton_streams": list(self.skeleton_streams.keys()),
             "timestamp": time.time()
         }
         message_json = json.dumps(message)
@@ -447,8 +1058,31 @@ class UltraOptimizedBitmapServer:
                 del self.unity_clients[client_id]
                 if client_id in self.latest_frames:
                     del self.latest_frames[client_id]
+                self.unity_codecs.pop(client_id, None)
+                self.pending_broadcasts.pop(client_id, None)
+                self.tier_frame_sizes.pop(client_id, None)
+                for key in [key for key in self.pending_renditions if key[0] == client_id]:
+                    del self.pending_renditions[key]
+                self.metrics.remove_stream(client_id)
+                self.compression_monitors.pop(client_id, None)
+                store = self.timeshift_stores.pop(client_id, None)
+                if store:
+                    store.close()
+                recorder = self.recorders.pop(client_id, None)
+                if recorder:
+                    recorder.close()
+                    logger.info(f"💾 Recorded {recorder.frames} frames to {recorder.data_path}")
                 logger.info(f"🗑 Unity client {client_id} cleaned up")
             
+            self.viewer_qualities.pop(websocket, None)
+            self.viewer_pending.pop(websocket, None)
+            send_task = self.viewer_sends.pop(websocket, None)
+            if send_task:
+                send_task.cancel()
+            self.stop_timeshift(websocket)
+            self.skeleton_subscriptions.pop(websocket, None)
+            self.skeleton_only_viewers.discard(websocket)
+            self.metrics.remove_viewer(websocket)
             if websocket in self.web_clients:
                 self.web_clients.remove(websocket)
                 logger.info("🗑 Web client cleaned up")
@@ -463,19 +1097,40 @@ class UltraOptimizedBitmapServer:
             
             uptime = time.time() - self.start_time
             
-            # Calculate FPS from recent frames
-            current_time = time.time()
-            recent_fps = 0
-            if len(self.recent_frames) > 1:
-                time_span = self.recent_frames[-1] - self.recent_frames[0]
-                if time_span > 0:
-                    recent_fps = (len(self.recent_frames) - 1) / time_span
+            # FPS over the last few seconds from the ring-buffer counter
+            recent_fps = self.metrics.ingest_rate.rate()
             
             logger.info(f"📊 Stats: Unity:{len(self.unity_clients)} Web:{len(self.web_clients)} "
                        f"Received:{self.frames_received} Broadcast:{self.frames_broadcasted} "
                        f"FPS:{recent_fps:.1f}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ultra-Optimized Bitmap Server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=52780)
+    parser.add_argument("--gzip-passthrough", action="store_true",
+                        help="Forward gzip frames compressed (only for viewers that decompress them)")
+    parser.add_argument("--transcode", action="store_true",
+                        help="Build lower quality renditions for viewers that subscribe to them")
+    parser.add_argument("--transcode-workers", type=int, default=2)
+    parser.add_argument("--timeshift-seconds", type=float, default=0,
+                        help="Keep this many seconds per stream for time-shifted viewing (0 = off)")
+    parser.add_argument("--timeshift-dir", default="timeshift",
+                        help="Directory for memory-mapped time-shift segments")
+    parser.add_argument("--record-dir", help="Continuously record every stream to this directory")
+    parser.add_argument("--landmark-port", type=int, default=0,
+                        help="UDP port for landmark packets from body tracking, usually 52782 (0 = off)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="HTTP port for /metrics and /stats, usually 52783 "
+                             "(0 = off, no per-viewer metrics with --workers)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Fan-out worker processes sharing the port (0 = single process)")
+    parser.add_argument("--ingest-port", type=int, default=52779,
+                        help="Unity ingest port when running with --workers")
+    return parser.parse_args()
+
 async def main():
+    args = parse_args()
     print("=== 🚀 Ultra-Optimized Bitmap Server (Real-time Performance) ===")
     print("Maximum performance Unity bitmap streaming")
     print("Features:")
@@ -484,12 +1139,35 @@ async def main():
     print("  • Concurrent client handling")
     print("  • Automatic FPS throttling")
     print("  • Thread pool optimization")
+    print("  • Codec negotiation with optional gzip pass-through")
+    print("  • Optional quality ladder for mobile viewers")
+    print("  • Multi-process fan-out over shared memory")
+    print("  • Time-shift buffer and recording")
+    print("  • Skeleton streams (~1 KB landmark packets)")
+    print("  • Metrics on HTTP /metrics and websocket 'stats'")
     print()
     
-    server = UltraOptimizedBitmapServer()
+    server_kwargs = {
+        "gzip_passthrough": args.gzip_passthrough,
+        "enable_transcoding": args.transcode,
+        "transcode_workers": args.transcode_workers,
+        "timeshift_seconds": args.timeshift_seconds,
+        "timeshift_dir": args.timeshift_dir,
+        "record_dir": args.record_dir,
+        "landmark_port": args.landmark_port or None,
+        "metrics_port": args.metrics_port or None
+    }
     
     try:
-        await server.start_server()
+        if args.workers > 0:
+            from fanout import run_scaled_server
+            print(f"Unity ingest on port {args.ingest_port}, {args.workers} viewer workers on port {args.port}")
+            if args.metrics_port:
+                print("Per-viewer metrics are not reported with --workers, stream metrics only")
+            await run_scaled_server(args.host, args.port, args.ingest_port, args.workers, server_kwargs)
+        else:
+            server = UltraOptimizedBitmapServer(host=args.host, port=args.port, **server_kwargs)
+            await server.start_server()
     except KeyboardInterrupt:
         print("\n⏹ Server stopped by user")
     except Exception as e:
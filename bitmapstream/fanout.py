@@ -0,0 +1,247 @@
+# fanout.py - Multi-process bitmap server: one ingest process, N fan-out workers
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import socket
+from typing import Dict, List
+
+from bitmap import UltraOptimizedBitmapServer
+from frame_ring import SharedFrameRing, ring_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INGEST_PORT = 52779
+FANOUT_POLL_INTERVAL = 0.002  # Seconds between ring polls in workers
+CONTROL_POLL_TIMEOUT = 0.5
+
+async def read_control_queue(control_queue, handler):
+    """Forward control messages from a multiprocessing queue to an async handler"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            message = await loop.run_in_executor(None, control_queue.get, True, CONTROL_POLL_TIMEOUT)
+        except queue.Empty:
+            continue
+        try:
+            await handler(message)
+        except Exception as e:
+            logger.error(f"❌ Control message error: {e}")
+
+class IngestServer(UltraOptimizedBitmapServer):
+    """Receives Unity frames and publishes them into one shared-memory ring per stream"""
+    def __init__(self, worker_queues, report_queue, **kwargs):
+        super().__init__(**kwargs)
+        self.worker_queues = worker_queues
+        self.report_queue = report_queue
+        self.rings: Dict[str, SharedFrameRing] = {}
+        self.worker_viewer_counts: Dict[int, int] = {}
+
+    def start_background_tasks(self):
+        super().start_background_tasks()
+        asyncio.create_task(read_control_queue(self.report_queue, self.handle_worker_report))
+
+    def get_web_client_count(self):
+        return len(self.web_clients) + sum(self.worker_viewer_counts.values())
+
+    async def register_unity_client(self, websocket, data, address):
+        client_id = await super().register_unity_client(websocket, data, address)
+        if client_id:
+            try:
+                self.rings[client_id] = SharedFrameRing(ring_name(client_id), create=True)
+            except Exception as e:
+                logger.error(f"❌ Failed to create frame ring for {client_id}: {e}")
+            self.publish_stream_list()
+        return client_id
+
+    def publish_frame(self, client_id, frame_header, frame_data, compression):
+        ring = self.rings.get(client_id)
+        if ring is not None:
+            header = dict(frame_header)
+            header['encoding'] = self.unity_codecs.get(client_id, {}).get('encoding', 'jpeg')
+            header['compression'] = compression
+            if not ring.write(frame_data, header):
+                logger.warning(f"⚠ Frame from {client_id} too large for ring ({len(frame_data)} bytes)")
+
+        # Viewers connected straight to the ingest port still get frames
+        super().publish_frame(client_id, frame_header, frame_data, compression)
+
+    def publish_stream_list(self):
+        """Send the stream -> ring mapping to every worker"""
+        message = {
+            "type": "streams",
+            "streams": {client_id: ring.name for client_id, ring in self.rings.items()}
+        }
+        for worker_queue in self.worker_queues:
+            worker_queue.put(message)
+
+    def handle_landmark_packet(self, packet, addr=None):
+        super().handle_landmark_packet(packet, addr)
+        # Landmark packets are tiny, workers get a copy over their control queue
+        for worker_queue in self.worker_queues:
+            worker_queue.put({"type": "landmark", "packet": packet})
+
+    async def handle_worker_report(self, message):
+        if message.get('type') == 'viewers':
+            self.worker_viewer_counts[message['worker']] = message['count']
+            await self.broadcast_client_count()
+
+    async def cleanup_client(self, websocket, client_id, client_type):
+        await super().cleanup_client(websocket, client_id, client_type)
+        ring = self.rings.pop(client_id, None) if client_id else None
+        if ring is not None:
+            self.publish_stream_list()
+            # Give workers a moment to detach before the segment is unlinked
+            await asyncio.sleep(CONTROL_POLL_TIMEOUT)
+            ring.close()
+
+    def close_rings(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+
+class FanoutWorker(UltraOptimizedBitmapServer):
+    """Accepts web viewers on a shared port and fans out frames read from shared memory"""
+    def __init__(self, worker_id, control_queue, report_queue, ingest_port=DEFAULT_INGEST_PORT, **kwargs):
+        super().__init__(**kwargs)
+        self.worker_id = worker_id
+        self.control_queue = control_queue
+        self.report_queue = report_queue
+        self.ingest_port = ingest_port
+        self.rings: Dict[str, SharedFrameRing] = {}
+        self.last_seqs: Dict[str, int] = {}
+        self.serve_options = {"reuse_port": True}
+
+    def start_background_tasks(self):
+        super().start_background_tasks()
+        asyncio.create_task(read_control_queue(self.control_queue, self.handle_control))
+        asyncio.create_task(self.poll_rings())
+
+    def get_stream_ids(self):
+        return list(self.rings.keys())
+
+    async def register_unity_client(self, websocket, data, address):
+        """Unity streamers belong on the ingest port in multi-process mode"""
+        await self.safe_send(websocket, json.dumps({
+            "type": "error",
+            "message": f"Connect Unity streamers to ingest port {self.ingest_port}"
+        }))
+        return None
+
+    async def broadcast_client_count(self):
+        """Report local viewer count to the ingest process for aggregation"""
+        self.report_queue.put({
+            "type": "viewers",
+            "worker": self.worker_id,
+            "count": len(self.web_clients)
+        })
+
+    async def cleanup_client(self, websocket, client_id, client_type):
+        was_viewer = websocket in self.web_clients
+        await super().cleanup_client(websocket, client_id, client_type)
+        if was_viewer:
+            await self.broadcast_client_count()
+
+    async def handle_control(self, message):
+        if message.get('type') == 'landmark':
+            self.handle_landmark_packet(message['packet'])
+            return
+        if message.get('type') != 'streams':
+            return
+
+        streams = message['streams']
+        for stream_id in list(self.rings.keys()):
+            if stream_id not in streams:
+                self.rings.pop(stream_id).close()
+                self.last_seqs.pop(stream_id, None)
+                self.latest_frames.pop(stream_id, None)
+
+        for stream_id, name in streams.items():
+            if stream_id not in self.rings:
+                try:
+                    self.rings[stream_id] = SharedFrameRing(name)
+                    self.last_seqs[stream_id] = 0
+                except FileNotFoundError:
+                    logger.warning(f"⚠ Frame ring {name} not found")
+
+        await self.broadcast_stream_list()
+
+    async def poll_rings(self):
+        """Pick up the newest frame of every stream, latest wins"""
+        while True:
+            await asyncio.sleep(FANOUT_POLL_INTERVAL)
+            for stream_id, ring in list(self.rings.items()):
+                try:
+                    if ring.write_seq == self.last_seqs.get(stream_id, 0):
+                        continue
+                    frame = ring.read_latest()
+                except Exception as e:
+                    logger.error(f"❌ Ring read error {stream_id}: {e}")
+                    continue
+                if frame is None:
+                    continue
+
+                seq, header, data, published = frame
+                self.last_seqs[stream_id] = seq
+                compression = header.get('compression', 'none')
+                self.latest_frames[stream_id] = {
+                    'header': header,
+                    'data': data,
+                    'timestamp': published,
+                    'frame_number': header.get('frame_number', 0),
+                    'size': len(data),
+                    'data_type': self.get_data_type(stream_id, header),
+                    'compression': compression
+                }
+                self.frames_received += 1
+                self.metrics.frame_received(stream_id, len(data))
+                super().publish_frame(stream_id, header, data, compression)
+
+def run_fanout_worker(worker_id, host, port, ingest_port, control_queue, report_queue, server_kwargs):
+    """Process entry point for a fan-out worker"""
+    # The ingest process owns the landmark tap and the metrics endpoint; viewers live in
+    # the workers, so per-viewer metrics are not on /metrics or /stats in this mode
+    worker_kwargs = dict(server_kwargs, landmark_port=None, metrics_port=None)
+    worker = FanoutWorker(
+        worker_id, control_queue, report_queue, ingest_port=ingest_port,
+        host=host, port=port, **worker_kwargs
+    )
+    try:
+        asyncio.run(worker.start_server())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for ring in worker.rings.values():
+            ring.close()
+
+async def run_scaled_server(host, port, ingest_port, workers, server_kwargs):
+    """Start N fan-out worker processes and run the ingest server in this process"""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Multi-process mode needs SO_REUSEPORT (Linux/macOS)")
+
+    # Spawn - workers start their own event loop, never inherit ours
+    context = multiprocessing.get_context("spawn")
+    report_queue = context.Queue()
+    worker_queues = [context.Queue() for _ in range(workers)]
+    processes: List[multiprocessing.Process] = []
+
+    for worker_id, control_queue in enumerate(worker_queues):
+        process = context.Process(
+            target=run_fanout_worker,
+            args=(worker_id, host, port, ingest_port, control_queue, report_queue, server_kwargs),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    logger.info(f"🧵 Started {workers} fan-out workers on ws://{host}:{port}")
+
+    ingest = IngestServer(worker_queues, report_queue, host=host, port=ingest_port, **server_kwargs)
+    try:
+        await ingest.start_server()
+    finally:
+        ingest.close_rings()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=2.0)
@@ -0,0 +1,116 @@
+# frame_ring.py - Shared-memory frame ring for cross-process fan-out
+import json
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# Ring layout: [ring header][slot 0][slot 1]...
+# Slot layout: [slot header][meta (JSON)][frame data]
+RING_HEADER = struct.Struct('<QII')    # write_seq, slot_count, slot_size
+SLOT_HEADER = struct.Struct('<QdIH')   # seq, publish timestamp, data size, meta size
+MAX_META_SIZE = 512
+
+DEFAULT_SLOT_COUNT = 4
+DEFAULT_MAX_FRAME_SIZE = 4 * 1024 * 1024  # Fits raw RGB24 720p frames
+
+# Frame header keys carried through the ring to fan-out workers
+META_KEYS = ('frame_number', 'timestamp', 'resolution', 'encoding', 'compression', 'ingest_time')
+
+def ring_name(stream_id) -> str:
+    return f"gtuverse_{stream_id}"
+
+class SharedFrameRing:
+    """Single-writer, multi-reader ring of frames in shared memory
+
+    Readers never block the writer: each slot carries the sequence number of
+    the frame in it and is re-checked after copying, so a slot overwritten
+    mid-read is detected and skipped.
+    """
+    def __init__(self, name, create=False, slot_count=DEFAULT_SLOT_COUNT,
+                 max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        if create:
+            slot_size = SLOT_HEADER.size + MAX_META_SIZE + max_frame_size
+            size = RING_HEADER.size + slot_count * slot_size
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a crashed run
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, slot_count, slot_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            _, slot_count, slot_size = RING_HEADER.unpack_from(self.shm.buf, 0)
+
+        self.name = name
+        self.owner = create
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.max_frame_size = slot_size - SLOT_HEADER.size - MAX_META_SIZE
+
+    @property
+    def write_seq(self) -> int:
+        return RING_HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def slot_offset(self, seq) -> int:
+        return RING_HEADER.size + (seq % self.slot_count) * self.slot_size
+
+    def write(self, data, frame_header) -> bool:
+        """Publish a frame, returns False if it does not fit in a slot"""
+        meta = json.dumps({key: frame_header[key] for key in META_KEYS if key in frame_header}).encode('utf-8')
+        if len(data) > self.max_frame_size or len(meta) > MAX_META_SIZE:
+            return False
+
+        buf = self.shm.buf
+        seq = self.write_seq + 1
+        offset = self.slot_offset(seq)
+        meta_offset = offset + SLOT_HEADER.size
+        data_offset = meta_offset + MAX_META_SIZE
+
+        # Invalidate slot while it is being rewritten
+        SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0, 0)
+        buf[meta_offset:meta_offset + len(meta)] = meta
+        buf[data_offset:data_offset + len(data)] = data
+        SLOT_HEADER.pack_into(buf, offset, seq, time.time(), len(data), len(meta))
+
+        RING_HEADER.pack_into(buf, 0, seq, self.slot_count, self.slot_size)
+        return True
+
+    def read(self, seq) -> Optional[Tuple[dict, bytes, float]]:
+        """Copy out frame `seq` as (header, data, publish timestamp), None if gone"""
+        buf = self.shm.buf
+        offset = self.slot_offset(seq)
+        slot_seq, published, size, meta_size = SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None
+
+        meta_offset = offset + SLOT_HEADER.size
+        data_offset = meta_offset + MAX_META_SIZE
+        meta = bytes(buf[meta_offset:meta_offset + meta_size])
+        data = bytes(buf[data_offset:data_offset + size])
+
+        # Writer lapped us while copying
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            return None
+
+        return json.loads(meta), data, published
+
+    def read_latest(self) -> Optional[Tuple[int, dict, bytes, float]]:
+        seq = self.write_seq
+        if seq == 0:
+            return None
+        frame = self.read(seq)
+        if frame is None:
+            return None
+        return (seq,) + frame
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
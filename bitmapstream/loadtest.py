@@ -0,0 +1,363 @@
+# loadtest.py - Localhost load generator for UltraOptimizedBitmapServer
+#
+# Simulates Unity streamers and web viewers against a server started in a child
+# process, then prints (or writes) machine-readable JSON results:
+#   python loadtest.py --streams 2 --viewers 200 --fps 45 --duration 30 --output results.json
+import asyncio
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import time
+import websockets
+
+try:
+    import psutil
+except ImportError:  # RSS falls back to /proc on Linux
+    psutil = None
+
+try:
+    from PIL import Image
+except ImportError:  # Synthetic frames fall back to JPEG-shaped random bytes
+    Image = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("loadtest")
+
+METRICS_INTERVAL = 1.0  # Seconds between server metric samples
+SERVER_START_TIMEOUT = 10.0
+
+def pad_jpeg(data, size) -> bytes:
+    """Pad a JPEG to `size` bytes with COM segments right after SOI, still decodable"""
+    segments = []
+    missing = size - len(data)
+    while missing > 4:
+        chunk = min(missing - 4, 65533)
+        segments.append(b'\xff\xfe' + struct.pack('>H', chunk + 2) + os.urandom(chunk))
+        missing -= chunk + 4
+    return data[:2] + b''.join(segments) + data[2:]
+
+def make_synthetic_jpeg(size, resolution) -> bytes:
+    """Build a JPEG of roughly `size` bytes (real JPEG if Pillow is installed)"""
+    if Image is not None:
+        width, height = (int(v) for v in resolution.split('x'))
+        image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=70)
+        return pad_jpeg(output.getvalue(), size)
+    return b'\xff\xd8\xff\xe0' + os.urandom(max(0, size - 6)) + b'\xff\xd9'
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(values, scale=1.0):
+    if not values:
+        return None
+    return {
+        "min": min(values) * scale,
+        "p50": percentile(values, 50) * scale,
+        "p95": percentile(values, 95) * scale,
+        "p99": percentile(values, 99) * scale,
+        "max": max(values) * scale,
+        "mean": sum(values) / len(values) * scale
+    }
+
+def read_rss() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+# ---------------------------------------------------------------------------
+# Server under test (child process)
+# ---------------------------------------------------------------------------
+
+async def sample_server_metrics(metrics_queue):
+    while True:
+        metrics_queue.put({
+            "time": time.time(),
+            "cpu_time": time.process_time(),
+            "rss": read_rss(),
+            "tasks": len(asyncio.all_tasks())
+        })
+        await asyncio.sleep(METRICS_INTERVAL)
+
+def run_server_process(host, port, metrics_queue, server_kwargs):
+    """Child process entry point: run the server and report CPU/RSS/task samples"""
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from bitmap import UltraOptimizedBitmapServer
+
+    async def serve():
+        server = UltraOptimizedBitmapServer(host=host, port=port, **server_kwargs)
+        asyncio.create_task(sample_server_metrics(metrics_queue))
+        await server.start_server()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+async def wait_for_server(url):
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            async with websockets.connect(url, open_timeout=1.0):
+                return
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake):
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+# ---------------------------------------------------------------------------
+# Simulated clients
+# ---------------------------------------------------------------------------
+
+async def drain(websocket):
+    try:
+        async for _ in websocket:
+            pass
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+async def run_unity_streamer(url, frame, resolution, fps, duration):
+    """Simulated unity_bitmap_streamer sending `frame` at a fixed rate"""
+    stats = {"frames_sent": 0, "bytes_sent": 0, "late_frames": 0, "error": None}
+    loop = asyncio.get_event_loop()
+    try:
+        async with websockets.connect(url, max_size=None, compression=None) as websocket:
+            await websocket.send(json.dumps({
+                "type": "unity_bitmap_streamer",
+                "version": "1.0",
+                "capabilities": {"resolution": resolution, "fps": fps, "compression": "none", "encoding": "jpeg"}
+            }))
+            await websocket.recv()  # registration_confirmed
+            drain_task = asyncio.create_task(drain(websocket))
+
+            interval = 1.0 / fps
+            next_send = loop.time()
+            end = next_send + duration
+            while loop.time() < end:
+                # Wall-clock timestamp so viewers on this host can measure glass-to-viewer latency
+                await websocket.send(json.dumps({
+                    "type": "bitmap_frame",
+                    "frame_number": stats["frames_sent"],
+                    "timestamp": time.time(),
+                    "resolution": resolution,
+                    "compression": "none",
+                    "encoding": "jpeg",
+                    "size": len(frame)
+                }))
+                await websocket.send(frame)
+                stats["frames_sent"] += 1
+                stats["bytes_sent"] += len(frame)
+
+                next_send += interval
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    stats["late_frames"] += 1
+            drain_task.cancel()
+    except Exception as e:
+        stats["error"] = str(e)
+    return stats
+
+async def run_viewer(url, duration, warmup):
+    """Simulated web_bitmap_viewer measuring frame rate and latency"""
+    stats = {"frames": 0, "bytes": 0, "latencies": [], "error": None}
+    loop = asyncio.get_event_loop()
+    try:
+        async with websockets.connect(url, max_size=None, compression=None) as websocket:
+            await websocket.send(json.dumps({"type": "web_bitmap_viewer"}))
+            start = loop.time()
+            measure_from = start + warmup
+            end = measure_from + duration
+            while True:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                received = time.time()
+                if loop.time() < measure_from or not isinstance(message, str):
+                    continue
+                data = json.loads(message)
+                if data.get("type") != "bitmap_frame":
+                    continue
+                stats["frames"] += 1
+                stats["bytes"] += len(message)
+                stats["latencies"].append(received - float(data.get("timestamp", received)))
+    except Exception as e:
+        stats["error"] = str(e)
+    stats["fps"] = stats["frames"] / duration
+    return stats
+
+def run_viewer_group(url, count, duration, warmup, ramp, result_queue):
+    """Process entry point: run `count` viewers and report their stats"""
+    async def group():
+        tasks = []
+        for _ in range(count):
+            tasks.append(asyncio.create_task(run_viewer(url, duration, warmup)))
+            await asyncio.sleep(ramp)
+        return await asyncio.gather(*tasks)
+
+    result_queue.put(asyncio.run(group()))
+
+# ---------------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------------
+
+def summarize_server(samples, measure_from):
+    samples = [s for s in samples if s["time"] >= measure_from]
+    if len(samples) < 2:
+        return None
+    cpu_percent = [
+        (b["cpu_time"] - a["cpu_time"]) / (b["time"] - a["time"]) * 100.0
+        for a, b in zip(samples, samples[1:]) if b["time"] > a["time"]
+    ]
+    rss = [s["rss"] for s in samples]
+    tasks = [s["tasks"] for s in samples]
+    return {
+        "samples": len(samples),
+        "cpu_percent": summarize(cpu_percent),
+        "rss_mb": {"start": rss[0] / 1e6, "end": rss[-1] / 1e6, "max": max(rss) / 1e6,
+                   "growth": (rss[-1] - rss[0]) / 1e6},
+        "asyncio_tasks": {"start": tasks[0], "end": tasks[-1], "max": max(tasks),
+                          "growth": tasks[-1] - tasks[0]}
+    }
+
+async def run_load_test(args):
+    url = args.url or f"ws://127.0.0.1:{args.port}"
+    context = multiprocessing.get_context("spawn")
+    metrics_queue = context.Queue()
+    result_queue = context.Queue()
+    server_process = None
+
+    if not args.url:
+        server_kwargs = {"enable_transcoding": args.transcode}
+        server_process = context.Process(
+            target=run_server_process, args=("127.0.0.1", args.port, metrics_queue, server_kwargs), daemon=True
+        )
+        server_process.start()
+    await wait_for_server(url)
+
+    frame = make_synthetic_jpeg(args.frame_size, args.resolution)
+    logger.info(f"🧪 {args.streams} streams x {args.fps} FPS ({len(frame)} byte frames), "
+                f"{args.viewers} viewers, {args.duration}s (+{args.warmup}s warmup)")
+
+    # Viewers are spread over processes so the generator is not the bottleneck
+    viewer_processes = []
+    processes = max(1, min(args.viewer_processes, args.viewers)) if args.viewers else 0
+    for i in range(processes):
+        count = args.viewers // processes + (1 if i < args.viewers % processes else 0)
+        process = context.Process(
+            target=run_viewer_group,
+            args=(url, count, args.duration, args.warmup, args.ramp, result_queue), daemon=True
+        )
+        process.start()
+        viewer_processes.append(process)
+
+    started = time.time()
+    measure_from = started + args.warmup
+    streamer_duration = args.warmup + args.duration + args.ramp * args.viewers / max(1, processes)
+    unity_stats = await asyncio.gather(*(
+        run_unity_streamer(url, frame, args.resolution, args.fps, streamer_duration)
+        for _ in range(args.streams)
+    ))
+
+    loop = asyncio.get_event_loop()
+    viewer_stats = []
+    for _ in viewer_processes:
+        viewer_stats.extend(await loop.run_in_executor(None, result_queue.get))
+    for process in viewer_processes:
+        process.join(timeout=5.0)
+
+    samples = []
+    while True:
+        try:
+            samples.append(metrics_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    if server_process is not None:
+        server_process.terminate()
+        server_process.join(timeout=5.0)
+
+    latencies = [value for stats in viewer_stats for value in stats["latencies"]]
+    return {
+        "timestamp": started,
+        "config": {
+            "url": url,
+            "streams": args.streams,
+            "viewers": args.viewers,
+            "fps": args.fps,
+            "frame_size": len(frame),
+            "resolution": args.resolution,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "transcode": args.transcode
+        },
+        "unity": {
+            "frames_sent": sum(s["frames_sent"] for s in unity_stats),
+            "late_frames": sum(s["late_frames"] for s in unity_stats),
+            "errors": [s["error"] for s in unity_stats if s["error"]]
+        },
+        "viewers": {
+            "connected": sum(1 for s in viewer_stats if not s["error"]),
+            "errors": sorted({s["error"] for s in viewer_stats if s["error"]}),
+            "frames_received": sum(s["frames"] for s in viewer_stats),
+            "fps": summarize([s["fps"] for s in viewer_stats]),
+            "expected_fps": args.fps * args.streams,
+            "latency_ms": summarize(latencies, scale=1000.0),
+            "throughput_mbps": sum(s["bytes"] for s in viewer_stats) * 8 / args.duration / 1e6
+        },
+        "server": summarize_server(samples, measure_from)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bitmap server load test")
+    parser.add_argument("--url", help="Test an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=52790, help="Port for the server started by the test")
+    parser.add_argument("--streams", type=int, default=1)
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--viewer-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--fps", type=float, default=45.0)
+    parser.add_argument("--frame-size", type=int, default=100_000, help="Synthetic JPEG size in bytes")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--ramp", type=float, default=0.01, help="Seconds between viewer connects")
+    parser.add_argument("--transcode", action="store_true")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run_load_test(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        logger.info(f"📄 Results written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# metrics.py - Rate counters, histograms and HTTP metrics endpoint for the bitmap server
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+RATE_WINDOW_SECONDS = 5
+
+class RateCounter:
+    """Events per second over a sliding window of one-second buckets, O(1) per event"""
+    def __init__(self, window=RATE_WINDOW_SECONDS):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [0] * window
+        self.total = 0
+
+    def add(self, count=1, now=None):
+        second = int(now or time.time())
+        index = second % self.window
+        if self.seconds[index] != second:
+            self.seconds[index] = second
+            self.counts[index] = 0
+        self.counts[index] += count
+        self.total += count
+
+    def rate(self, now=None) -> float:
+        """Average rate over the last complete seconds of the window"""
+        second = int(now or time.time())
+        events = sum(
+            count for count, bucket in zip(self.counts, self.seconds)
+            if second - self.window < bucket < second
+        )
+        return events / (self.window - 1)
+
+class Histogram:
+    """Fixed-bucket histogram, constant memory"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+class StreamMetrics:
+    """Ingest and fan-out metrics of one Unity stream"""
+    def __init__(self):
+        self.ingest_rate = RateCounter()
+        self.frames_received = 0
+        self.frames_dropped = 0  # Throttled or superseded before broadcast
+        self.frame_size = Histogram(SIZE_BUCKETS)
+        self.ingest_to_send = Histogram()
+
+class ViewerMetrics:
+    """Send metrics of one web viewer"""
+    def __init__(self, viewer_id, address):
+        self.id = viewer_id  # Opaque, safe to show to other viewers
+        self.address = address
+        self.send_rate = RateCounter()
+        self.frames_sent = 0
+        self.drops = 0
+        self.send_duration = Histogram()
+        self.message_size = Histogram(SIZE_BUCKETS)
+        self.ingest_to_send = Histogram()
+
+class ServerMetrics:
+    """All metrics of a bitmap server instance"""
+    def __init__(self):
+        self.started = time.time()
+        self.ingest_rate = RateCounter()
+        self.streams: Dict[str, StreamMetrics] = {}
+        self.viewers: Dict[object, ViewerMetrics] = {}
+        self.viewers_seen = 0
+        self.gauges: Dict[str, Callable[[], float]] = {}
+
+    def stream(self, stream_id) -> StreamMetrics:
+        metrics = self.streams.get(stream_id)
+        if metrics is None:
+            metrics = self.streams[stream_id] = StreamMetrics()
+        return metrics
+
+    def viewer(self, websocket, address="unknown") -> ViewerMetrics:
+        metrics = self.viewers.get(websocket)
+        if metrics is None:
+            self.viewers_seen += 1
+            metrics = self.viewers[websocket] = ViewerMetrics(f"viewer-{self.viewers_seen}", address)
+        return metrics
+
+    def frame_received(self, stream_id, size, now=None):
+        stream = self.stream(stream_id)
+        stream.ingest_rate.add(1, now)
+        stream.frames_received += 1
+        stream.frame_size.observe(size)
+        self.ingest_rate.add(1, now)
+
+    def frame_dropped(self, stream_id):
+        self.stream(stream_id).frames_dropped += 1
+
+    def frame_sent(self, websocket, stream_id, size, duration, ingest_time=None):
+        viewer = self.viewer(websocket)
+        viewer.send_rate.add()
+        viewer.frames_sent += 1
+        viewer.send_duration.observe(duration)
+        viewer.message_size.observe(size)
+        if ingest_time is not None:
+            latency = time.time() - ingest_time
+            viewer.ingest_to_send.observe(latency)
+            if stream_id is not None:
+                self.stream(stream_id).ingest_to_send.observe(latency)
+
+    def viewer_dropped(self, websocket):
+        viewer = self.viewers.get(websocket)  # Never recreate a viewer that was already removed
+        if viewer is not None:
+            viewer.drops += 1
+
+    def remove_stream(self, stream_id):
+        self.streams.pop(stream_id, None)
+
+    def remove_viewer(self, websocket):
+        self.viewers.pop(websocket, None)
+
+    def add_gauge(self, name, getter):
+        """Register a live value sampled at scrape time (task counts, queue depths)"""
+        self.gauges[name] = getter
+
+    def read_gauges(self) -> dict:
+        values = {}
+        for name, getter in self.gauges.items():
+            try:
+                values[name] = getter()
+            except Exception:
+                values[name] = None
+        return values
+
+    def snapshot(self, include_addresses=False) -> dict:
+        """JSON-friendly view for the stats websocket message and /stats
+
+        Viewer addresses are only included for the local metrics port, any
+        connected viewer can ask for the websocket stats.
+        """
+        return {
+            "uptime": time.time() - self.started,
+            "ingest_fps": self.ingest_rate.rate(),
+            "gauges": self.read_gauges(),
+            "streams": {
+                stream_id: {
+                    "fps": stream.ingest_rate.rate(),
+                    "frames_received": stream.frames_received,
+                    "frames_dropped": stream.frames_dropped,
+                    "frame_size": stream.frame_size.summary(),
+                    "ingest_to_send": stream.ingest_to_send.summary()
+                }
+                for stream_id, stream in self.streams.items()
+            },
+            "viewers": [
+                dict({
+                    "id": viewer.id,
+                    "fps": viewer.send_rate.rate(),
+                    "frames_sent": viewer.frames_sent,
+                    "drops": viewer.drops,
+                    "send_duration": viewer.send_duration.summary(),
+                    "message_size": viewer.message_size.summary(),
+                    "ingest_to_send": viewer.ingest_to_send.summary()
+                }, **({"address": viewer.address} if include_addresses else {}))
+                for viewer in self.viewers.values()
+            ]
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format, each family grouped under its HELP/TYPE lines"""
+        lines = []
+        lines += family("bitmap_uptime_seconds", "gauge", "Seconds since the server started")
+        lines.append(f"bitmap_uptime_seconds {time.time() - self.started:.3f}")
+        lines += family("bitmap_ingest_fps", "gauge", "Frames per second received over all streams")
+        lines.append(f"bitmap_ingest_fps {self.ingest_rate.rate():.3f}")
+        for name, value in self.read_gauges().items():
+            if value is not None:
+                lines += family(f"bitmap_{name}", "gauge", f"Live {name.replace('_', ' ')}")
+                lines.append(f"bitmap_{name} {value}")
+
+        streams = [(f'stream="{stream_id}"', stream) for stream_id, stream in self.streams.items()]
+        for name, metric_type, help_text, value in STREAM_VALUES:
+            lines += family(name, metric_type, help_text)
+            lines.extend(f"{name}{{{labels}}} {value(stream)}" for labels, stream in streams)
+        for name, help_text, histogram in STREAM_HISTOGRAMS:
+            lines += family(name, "histogram", help_text)
+            for labels, stream in streams:
+                lines.extend(render_histogram(name, labels, histogram(stream)))
+
+        viewers = [(f'viewer="{viewer.address}"', viewer) for viewer in self.viewers.values()]
+        for name, metric_type, help_text, value in VIEWER_VALUES:
+            lines += family(name, metric_type, help_text)
+            lines.extend(f"{name}{{{labels}}} {value(viewer)}" for labels, viewer in viewers)
+        for name, help_text, histogram in VIEWER_HISTOGRAMS:
+            lines += family(name, "histogram", help_text)
+            for labels, viewer in viewers:
+                lines.extend(render_histogram(name, labels, histogram(viewer)))
+
+        return "\n".join(lines) + "\n"
+
+# Per-stream and per-viewer families: (name, type, help, value) and (name, help, histogram)
+STREAM_VALUES = (
+    ("bitmap_stream_fps", "gauge", "Frames per second received on the stream",
+     lambda stream: f"{stream.ingest_rate.rate():.3f}"),
+    ("bitmap_stream_frames_received_total", "counter", "Frames received on the stream",
+     lambda stream: stream.frames_received),
+    ("bitmap_stream_frames_dropped_total", "counter", "Frames throttled or superseded before broadcast",
+     lambda stream: stream.frames_dropped),
+)
+STREAM_HISTOGRAMS = (
+    ("bitmap_stream_frame_bytes", "Size of received frames", lambda stream: stream.frame_size),
+    ("bitmap_stream_ingest_to_send_seconds", "Time from ingest to a viewer send completing",
+     lambda stream: stream.ingest_to_send),
+)
+VIEWER_VALUES = (
+    ("bitmap_viewer_fps", "gauge", "Frames per second sent to the viewer",
+     lambda viewer: f"{viewer.send_rate.rate():.3f}"),
+    ("bitmap_viewer_frames_sent_total", "counter", "Frames sent to the viewer", lambda viewer: viewer.frames_sent),
+    ("bitmap_viewer_drops_total", "counter", "Frames the viewer missed while behind", lambda viewer: viewer.drops),
+)
+VIEWER_HISTOGRAMS = (
+    ("bitmap_viewer_send_seconds", "Duration of sends to the viewer", lambda viewer: viewer.send_duration),
+    ("bitmap_viewer_message_bytes", "Size of messages sent to the viewer", lambda viewer: viewer.message_size),
+    ("bitmap_viewer_ingest_to_send_seconds", "Time from ingest to the send completing",
+     lambda viewer: viewer.ingest_to_send),
+)
+
+def family(name, metric_type, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+def render_histogram(name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}'
+    yield f"{name}_sum{{{labels}}} {histogram.sum:.6f}"
+    yield f"{name}_count{{{labels}}} {histogram.count}"
+
+async def serve_metrics(metrics: ServerMetrics, host, port):
+    """Minimal HTTP endpoint: GET /metrics (Prometheus) and GET /stats (JSON)"""
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Drain headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5.0)) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path.startswith('/metrics'):
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4", metrics.render_prometheus()
+            elif path.startswith('/stats'):
+                status, content_type, body = "200 OK", "application/json", json.dumps(metrics.snapshot(include_addresses=True))
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "Not Found"
+
+            payload = body.encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"❌ Metrics request error: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"📈 Metrics endpoint on http://{host}:{port}/metrics")
+    return server
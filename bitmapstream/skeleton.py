@@ -0,0 +1,59 @@
+# skeleton.py - Landmark (skeleton) streams fanned out next to bitmap streams
+import asyncio
+import struct
+from typing import Callable, Optional, Tuple
+
+# Binary landmark packet, forwarded to viewers untouched (must match
+# multi-camera-body-tracking/landmark_tap.py):
+#   magic 'GTLM', version, landmark count, camera id, sequence, capture timestamp
+#   followed by count * (x, y, z) float32 world coordinates
+LANDMARK_MAGIC = b'GTLM'
+LANDMARK_VERSION = 1
+LANDMARK_HEADER = struct.Struct('<4sBBHQd')
+LANDMARK_COUNT = 33
+
+SKELETON_STREAM_PREFIX = "skeleton_"
+SKELETON_STREAM_TIMEOUT = 5.0  # Seconds without packets before a stream is dropped
+DEFAULT_LANDMARK_PORT = 52782
+
+def parse_landmark_header(packet) -> Optional[Tuple[int, int, float]]:
+    """Validate a landmark packet and return (camera id, sequence, timestamp)"""
+    if len(packet) < LANDMARK_HEADER.size:
+        return None
+    magic, version, count, camera_id, seq, timestamp = LANDMARK_HEADER.unpack_from(packet, 0)
+    if magic != LANDMARK_MAGIC or version != LANDMARK_VERSION:
+        return None
+    if len(packet) != LANDMARK_HEADER.size + count * 12:
+        return None
+    return camera_id, seq, timestamp
+
+def skeleton_stream_id(camera_id) -> str:
+    return f"{SKELETON_STREAM_PREFIX}{camera_id}"
+
+class SkeletonStream:
+    """Latest landmark packet of one camera"""
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.last_seq = -1
+        self.last_seen = 0.0
+        self.latest_packet = None
+        self.packets = 0
+
+    def accept(self, seq, packet, now) -> bool:
+        """Store a packet unless it is older than the one we have"""
+        # Sequence restarts (tracker restarted) are accepted after a gap
+        if seq <= self.last_seq and now - self.last_seen < 1.0:
+            return False
+        self.last_seq = seq
+        self.last_seen = now
+        self.latest_packet = packet
+        self.packets += 1
+        return True
+
+class LandmarkTapProtocol(asyncio.DatagramProtocol):
+    """UDP endpoint receiving landmark packets from the body tracking server"""
+    def __init__(self, handler: Callable[[bytes, tuple], None]):
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        self.handler(data, addr)
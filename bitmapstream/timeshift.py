@@ -0,0 +1,186 @@
+# timeshift.py - Time-shift buffer and recording for bitmap streams
+import json
+import mmap
+import os
+import shutil
+import struct
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+# Index entry: stored_at, frame_number, segment, offset, data size, meta size
+INDEX_ENTRY = struct.Struct('<dqIIIH')
+MAX_INDEX_FPS = 90  # Index capacity per second of retention (server throttle rate)
+
+DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+DEFAULT_RETENTION_SECONDS = 60.0
+
+def map_file(path, size) -> Tuple[object, mmap.mmap]:
+    f = open(path, 'w+b')
+    f.truncate(size)
+    return f, mmap.mmap(f.fileno(), size)
+
+class Segment:
+    """Fixed-size memory-mapped file holding frame records back to back"""
+    def __init__(self, segment_id, path, size):
+        self.id = segment_id
+        self.path = path
+        self.size = size
+        self.file, self.map = map_file(path, size)
+        self.write_offset = 0
+        self.last_timestamp = 0.0
+
+    def fits(self, length) -> bool:
+        return self.write_offset + length <= self.size
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+class TimeshiftStore:
+    """Per-stream ring of recent frames in memory-mapped segment files
+
+    Frames live in segment files and the index is a fixed-capacity ring in its
+    own memory-mapped file, so process memory stays flat however long the
+    retention is. Entries are addressed by a monotonic sequence number; readers
+    holding an evicted sequence simply resume from the oldest one.
+    """
+    def __init__(self, directory, retention_seconds=DEFAULT_RETENTION_SECONDS,
+                 segment_size=DEFAULT_SEGMENT_SIZE):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.capacity = max(1024, int(retention_seconds * MAX_INDEX_FPS * 1.25))
+        self.index_file, self.index = map_file(
+            os.path.join(directory, 'index.bin'), self.capacity * INDEX_ENTRY.size
+        )
+        self.head_seq = 0  # Oldest valid entry
+        self.tail_seq = 0  # Next entry to write
+
+        self.segments: List[Segment] = []
+        self.order = deque()  # Segment ids, oldest first
+        self.current = self.add_segment()
+
+    def add_segment(self) -> Segment:
+        segment_id = len(self.segments)
+        path = os.path.join(self.directory, f'segment_{segment_id:04d}.bin')
+        segment = Segment(segment_id, path, self.segment_size)
+        self.segments.append(segment)
+        self.order.append(segment_id)
+        return segment
+
+    def next_segment(self, now) -> Segment:
+        """Recycle the oldest segment once it is past retention, otherwise grow"""
+        oldest = self.segments[self.order[0]]
+        if oldest is not self.current and oldest.last_timestamp < now - self.retention_seconds:
+            self.evict_segment(oldest.id)
+            self.order.rotate(-1)
+            oldest.write_offset = 0
+            return oldest
+        return self.add_segment()
+
+    def evict_segment(self, segment_id):
+        while self.head_seq < self.tail_seq and self.entry(self.head_seq)[2] == segment_id:
+            self.head_seq += 1
+
+    def entry(self, seq):
+        return INDEX_ENTRY.unpack_from(self.index, (seq % self.capacity) * INDEX_ENTRY.size)
+
+    def write_entry(self, seq, *values):
+        INDEX_ENTRY.pack_into(self.index, (seq % self.capacity) * INDEX_ENTRY.size, *values)
+
+    def append(self, data, frame_header, stored_at=None) -> int:
+        """Store a frame and return its sequence number"""
+        stored_at = stored_at or time.time()
+        meta = json.dumps(frame_header).encode('utf-8')
+        length = len(meta) + len(data)
+        if length > self.segment_size:
+            raise ValueError(f"Frame of {length} bytes larger than segment")
+
+        if not self.current.fits(length):
+            self.current = self.next_segment(stored_at)
+
+        segment = self.current
+        offset = segment.write_offset
+        segment.map[offset:offset + len(meta)] = meta
+        segment.map[offset + len(meta):offset + length] = data
+        segment.write_offset += length
+        segment.last_timestamp = stored_at
+
+        # Index ring full - oldest entry falls off
+        if self.tail_seq - self.head_seq >= self.capacity:
+            self.head_seq += 1
+
+        seq = self.tail_seq
+        self.write_entry(seq, stored_at, int(frame_header.get('frame_number', 0)),
+                         segment.id, offset, len(data), len(meta))
+        self.tail_seq += 1
+        return seq
+
+    def read(self, seq) -> Optional[Tuple[dict, bytes, float]]:
+        """Return (header, data, stored_at) for `seq`, None if evicted or not written yet"""
+        if seq < self.head_seq or seq >= self.tail_seq:
+            return None
+        stored_at, _, segment_id, offset, size, meta_size = self.entry(seq)
+        segment = self.segments[segment_id]
+        meta = segment.map[offset:offset + meta_size]
+        data = segment.map[offset + meta_size:offset + meta_size + size]
+        return json.loads(meta), data, stored_at
+
+    def find_time(self, timestamp) -> int:
+        """First sequence stored at or after `timestamp` (binary search on the index)"""
+        low, high = self.head_seq, self.tail_seq
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_frame(self, frame_number) -> Optional[int]:
+        """Sequence holding `frame_number`, None if it is not retained"""
+        low, high = self.head_seq, self.tail_seq
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[1] < frame_number:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.tail_seq and self.entry(low)[1] == frame_number:
+            return low
+        return None
+
+    def close(self, remove=True):
+        for segment in self.segments:
+            segment.close()
+        self.index.close()
+        self.index_file.close()
+        if remove:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+class FrameRecorder:
+    """Appends every frame of a stream to disk with a seekable index file"""
+    def __init__(self, directory, stream_id):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{stream_id}_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.data_path = base + '.frames'
+        self.data_file = open(self.data_path, 'ab')
+        self.index_file = open(base + '.index', 'ab')
+        self.frames = 0
+
+    def write(self, data, frame_header, stored_at):
+        meta = json.dumps(frame_header).encode('utf-8')
+        offset = self.data_file.tell()
+        self.data_file.write(meta)
+        self.data_file.write(data)
+        self.index_file.write(INDEX_ENTRY.pack(
+            stored_at, int(frame_header.get('frame_number', 0)), 0, offset, len(data), len(meta)
+        ))
+        self.frames += 1
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
@@ -0,0 +1,141 @@
+# transcoder.py - Multi-quality rendition ladder for bitmap viewers
+import io
+import gzip
+import time
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Transcoding is optional, server falls back to source frames
+    Image = None
+
+# Rendition ladder, highest quality first. 'source' is Unity's frame untouched.
+RENDITION_TIERS = [
+    {'name': 'source', 'height': None, 'quality': None, 'size_factor': 1.0},
+    {'name': 'medium', 'height': 480, 'quality': 65, 'size_factor': 0.4},
+    {'name': 'low', 'height': 270, 'quality': 50, 'size_factor': 0.15},
+]
+TIER_NAMES = [tier['name'] for tier in RENDITION_TIERS]
+SOURCE_TIER = 'source'
+AUTO_TIER = 'auto'
+
+# Auto tier selection
+VIEWER_TARGET_FPS = 45
+THROUGHPUT_EWMA_ALPHA = 0.2
+THROUGHPUT_HEADROOM = 0.7  # Only use 70% of measured throughput
+TIER_SWITCH_INTERVAL = 2.0  # Seconds between tier changes per viewer
+
+def transcoding_available() -> bool:
+    return Image is not None
+
+def get_tier(name) -> Optional[dict]:
+    for tier in RENDITION_TIERS:
+        if tier['name'] == name:
+            return tier
+    return None
+
+def parse_resolution(resolution, default=(1280, 720)) -> Tuple[int, int]:
+    """Parse '1280x720' into (width, height)"""
+    try:
+        width, height = str(resolution).lower().split('x')
+        return int(width), int(height)
+    except (ValueError, AttributeError):
+        return default
+
+def rendition_size(resolution, tier) -> Optional[Tuple[int, int]]:
+    """Output size for a tier, None if the source is already small enough"""
+    src_width, src_height = parse_resolution(resolution)
+    if tier['height'] is None or src_height <= tier['height']:
+        return None
+    height = tier['height']
+    width = int(src_width * height / src_height) & ~1  # Keep even for decoders
+    return width, height
+
+def transcode_frame(data, compression, encoding, resolution, width, height, quality) -> bytes:
+    """Decode, downscale and re-encode a frame as JPEG (runs in the process pool)"""
+    if compression == 'gzip':
+        data = gzip.decompress(data)
+
+    if encoding == 'rgb24':
+        image = Image.frombytes('RGB', parse_resolution(resolution), data)  # Rows top-down
+    else:
+        image = Image.open(io.BytesIO(data))
+        image.draft('RGB', (width, height))  # JPEG DCT scaling - decode at reduced size
+        image = image.convert('RGB')
+
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.BILINEAR)
+
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=quality)
+    return output.getvalue()
+
+class ViewerQuality:
+    """Rendition tier of one viewer, picked manually or from measured send throughput
+
+    Throughput is what the viewer's transport drained while a send ran, not
+    how fast websocket.send returned (mostly a buffer copy), and a send still
+    in flight after a frame period counts as a low sample before it completes.
+    """
+    def __init__(self, requested=AUTO_TIER):
+        self.requested = requested
+        self.tier = SOURCE_TIER
+        self.throughput = None  # Bytes per second, EWMA
+        self.last_switch = 0.0
+        self.in_flight = None  # (size, start) of the send being measured
+
+    def request(self, tier_name) -> bool:
+        if tier_name != AUTO_TIER and tier_name not in TIER_NAMES:
+            return False
+        self.requested = tier_name
+        if tier_name != AUTO_TIER:
+            self.tier = tier_name
+        return True
+
+    def record_send(self, size, duration):
+        if duration <= 0:
+            return
+        sample = size / duration
+        if self.throughput is None:
+            self.throughput = sample
+        else:
+            self.throughput += (sample - self.throughput) * THROUGHPUT_EWMA_ALPHA
+
+    def start_send(self, size, now):
+        self.in_flight = (size, now)
+
+    def finish_send(self, drained, now):
+        """Sample the bytes the transport drained since the send started"""
+        if self.in_flight is not None:
+            self.record_send(max(drained, 0), now - self.in_flight[1])
+            self.in_flight = None
+
+    def record_stall(self, now):
+        """A new frame arrived while the send is still in flight, it moved at most size / elapsed"""
+        if self.in_flight is None:
+            return
+        size, started = self.in_flight
+        if now - started >= 1.0 / VIEWER_TARGET_FPS:
+            self.record_send(size, now - started)
+
+    def select(self, tier_frame_sizes, now=None) -> str:
+        """Current tier; auto viewers step to the best tier their throughput sustains"""
+        if self.requested != AUTO_TIER or self.throughput is None:
+            return self.tier
+
+        now = now or time.time()
+        if now - self.last_switch < TIER_SWITCH_INTERVAL:
+            return self.tier
+
+        budget = self.throughput * THROUGHPUT_HEADROOM
+        chosen = TIER_NAMES[-1]
+        for tier in RENDITION_TIERS:
+            frame_size = tier_frame_sizes.get(tier['name'])
+            if frame_size is not None and frame_size * VIEWER_TARGET_FPS <= budget:
+                chosen = tier['name']
+                break
+
+        if chosen != self.tier:
+            self.tier = chosen
+            self.last_switch = now
+        return self.tier
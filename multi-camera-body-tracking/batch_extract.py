@@ -0,0 +1,228 @@
+# Offline pose extraction over recorded video, every frame, all cores
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from body import LandmarkSmoother, create_pose, infer_landmarks, resize_for_processing
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+LANDMARK_COUNT = 33
+DEFAULT_CHUNK_FRAMES = 1800  # Frame range per task (~1 min at 30 fps), also the checkpoint granularity
+WARMUP_FRAMES = 15  # Frames run before a chunk start to settle tracking and smoothing, not written
+SEEK_BACK_OFF_FRAMES = 30  # First step back when a seek lands past the wanted frame, doubles each retry
+END_CHECK_GRABS = 3  # Frames tried after a failed read before calling it the end of the stream
+
+def find_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.extend(sorted(glob.glob(path)) or [path])
+    return videos
+
+def count_frames(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise IOError(f"Cannot open {video_path}")
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            # Container without a frame count, decode to count
+            count = 0
+            while cap.grab():
+                count += 1
+        return count
+    finally:
+        cap.release()
+
+def video_stem(video_path):
+    return os.path.splitext(os.path.basename(video_path))[0]
+
+def chunk_path(output_dir, video_path, start, end):
+    return os.path.join(output_dir, f"{video_stem(video_path)}.{start:08d}-{end:08d}.npz")
+
+def save_npz(path, **arrays):
+    """Write atomically, a file that exists is always complete (resume relies on it)"""
+    temp_path = path + '.tmp.npz'
+    np.savez_compressed(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+def at_end_of_stream(cap):
+    """A failed read is the real end only if nothing after it decodes either"""
+    return not any(cap.grab() for _ in range(END_CHECK_GRABS))
+
+def open_at_frame(video_path, first):
+    """Open a video positioned exactly at frame `first`, EOFError if the stream is shorter"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {video_path}")
+
+    # Seeking is inexact for many codecs (lands on a keyframe): seek at or before
+    # `first`, backing off further when it lands past it, then decode forward
+    position = 0
+    target = first
+    back_off = SEEK_BACK_OFF_FRAMES
+    while target > 0:
+        if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if 0 <= position <= first:
+                break
+        target = max(0, first - back_off)
+        back_off *= 2
+    else:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        position = 0
+
+    for _ in range(first - position):
+        if not cap.grab():
+            cap.release()
+            raise EOFError(f"{video_path} ended before frame {first}")
+    return cap
+
+def extract_chunk(video_path, start, end, output_path, smoothing=True):
+    """Run pose on frames [start, end) of a video and save them, returns frames written
+
+    Container frame counts can be estimates: a chunk that reaches the real end
+    of the stream is saved short (or empty). A read that fails before the end
+    fails the chunk, so no checkpoint is written and a resume retries it.
+    """
+    cv2.setNumThreads(1)  # One pose model per process, the pool provides the parallelism
+    first = max(0, start - WARMUP_FRAMES)
+    try:
+        cap = open_at_frame(video_path, first)
+    except EOFError:
+        cap = None  # Past the real end, nothing to extract
+
+    count = end - start
+    landmarks = np.full((count, LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+    timestamps = np.zeros(count, dtype=np.float64)
+    valid = np.zeros(count, dtype=bool)
+    smoother = LandmarkSmoother() if smoothing else None
+
+    written = 0
+    if cap is not None:
+        try:
+            with create_pose() as pose:
+                for index in range(first, end):
+                    ret, frame = cap.read()
+                    if not ret:
+                        if not at_end_of_stream(cap):
+                            raise IOError(f"frame {index} failed to decode, {written} of {count} frames done")
+                        break
+                    timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                    world_landmarks = infer_landmarks(pose, resize_for_processing(frame))
+                    if world_landmarks and smoother:
+                        world_landmarks = smoother.smooth(world_landmarks, timestamp)
+
+                    if index < start:
+                        continue
+                    row = index - start
+                    timestamps[row] = timestamp
+                    if world_landmarks:
+                        landmarks[row] = [[lm.x, lm.y, lm.z] for lm in world_landmarks.landmark[:LANDMARK_COUNT]]
+                        valid[row] = True
+                    written = row + 1
+        finally:
+            cap.release()
+
+    save_npz(output_path,
+             landmarks=landmarks[:written], timestamps=timestamps[:written],
+             frames=np.arange(start, start + written, dtype=np.int64), valid=valid[:written])
+    return written
+
+def merge_chunks(chunk_paths, output_path, output_format):
+    parts = [np.load(path) for path in chunk_paths]
+    merged = {key: np.concatenate([part[key] for part in parts]) for key in ('landmarks', 'timestamps', 'frames', 'valid')}
+
+    if output_format == 'npz':
+        save_npz(output_path, **merged)
+        return
+
+    # Parquet: one row per frame, x0, y0, z0 ... z32 columns
+    try:
+        import pandas as pd
+    except ImportError:
+        raise SystemExit("Parquet output needs pandas and pyarrow (pip install pandas pyarrow)")
+    columns = {"frame": merged['frames'], "timestamp": merged['timestamps'], "valid": merged['valid']}
+    flat = merged['landmarks'].reshape(len(merged['frames']), -1)
+    for i in range(LANDMARK_COUNT):
+        for axis_index, axis in enumerate('xyz'):
+            columns[f"{axis}{i}"] = flat[:, i * 3 + axis_index]
+    temp_path = output_path + '.tmp'
+    pd.DataFrame(columns).to_parquet(temp_path, index=False)
+    os.replace(temp_path, output_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract pose landmarks from recorded video (no frame drops)')
+    parser.add_argument('inputs', nargs='+', help='Video files, directories or glob patterns')
+    parser.add_argument('--output-dir', default='landmarks', help='Where results and checkpoints are written')
+    parser.add_argument('--format', choices=('npz', 'parquet'), default='npz', help='Merged output format')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES,
+                        help='Frames per task and checkpoint (0 for whole files)')
+    parser.add_argument('--no-smoothing', action='store_true', help='Write raw landmarks without LandmarkSmoother')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    videos = find_videos(args.inputs)
+    if not videos:
+        raise SystemExit("No videos found")
+    chunk_dir = os.path.join(args.output_dir, 'chunks')
+    os.makedirs(chunk_dir, exist_ok=True)
+
+    # Plan every chunk, skipping those finished by an earlier run
+    plan = {}
+    tasks = []
+    for video in videos:
+        total = count_frames(video)
+        step = args.chunk_frames or total or 1
+        plan[video] = []
+        for start in range(0, total, step):
+            end = min(start + step, total)
+            path = chunk_path(chunk_dir, video, start, end)
+            plan[video].append(path)
+            if not os.path.exists(path):
+                tasks.append((video, start, end, path))
+        print(f"{video}: {total} frames, {len(plan[video])} chunks")
+
+    done_before = sum(len(paths) for paths in plan.values()) - len(tasks)
+    if done_before:
+        print(f"Resuming: {done_before} chunks already done")
+
+    started = time.time()
+    frames_done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(extract_chunk, video, start, end, path, not args.no_smoothing): (video, start, end)
+            for video, start, end, path in tasks
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            video, start, end = futures[future]
+            try:
+                frames_done += future.result()
+            except Exception as e:
+                print(f"❌ {video} [{start}, {end}) failed: {e}")
+                continue
+            elapsed = time.time() - started
+            print(f"[{i}/{len(tasks)}] {video_stem(video)} [{start}, {end}) - {frames_done / elapsed:.1f} frames/s")
+
+    for video, paths in plan.items():
+        if not paths:
+            print(f"⚠️ {video}: no frames")
+            continue
+        if not all(os.path.exists(path) for path in paths):
+            print(f"⚠️ {video}: incomplete, run again to resume")
+            continue
+        output_path = os.path.join(args.output_dir, f"{video_stem(video)}.{args.format}")
+        merge_chunks(paths, output_path, args.format)
+        print(f"✅ {output_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# Hot-path microbenchmarks with regression thresholds
+#
+# Runs offline on synthetic fixtures (JPEG frames, landmark lists) and reports
+# ops/s, latency percentiles and peak allocation per call for each path:
+#   python benchmark.py                   # compare against benchmark_baseline.json
+#   python benchmark.py --save-baseline   # record a new baseline on this machine
+#   python benchmark.py --only smoother --seconds 5
+# Exits with status 1 when a path is slower (ops/s) or allocates more than the
+# baseline by more than --threshold, and 2 when there is no baseline to compare with.
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import global_vars
+from mediapipe.framework.formats import landmark_pb2
+from body import FrameBuffer, LandmarkSmoother, UDPFrameReceiver, format_landmark_message
+from clientUDP import ClientUDP
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+BITMAPSTREAM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bitmapstream')
+
+DEFAULT_SECONDS = 2.0
+DEFAULT_THRESHOLD = 0.2  # Allowed relative regression before failing
+WARMUP_CALLS = 50
+ALLOCATION_CALLS = 200
+CAMERA_SIZE = (640, 480)  # Synthetic camera frame, decoded and resized like a live one
+
+def synthetic_frame(width, height, seed=0):
+    """Smooth gradients plus noise, compresses like a camera image rather than pure noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 127 // (width + height))], axis=-1)
+    frame = frame + rng.integers(0, 24, size=frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+def synthetic_jpeg(width, height, seed=0):
+    _, jpeg = cv2.imencode('.jpg', synthetic_frame(width, height, seed))
+    return jpeg.tobytes()
+
+def synthetic_landmarks(count, seed=0):
+    """Landmark lists shaped like MediaPipe world landmarks, with small frame-to-frame motion"""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(-0.5, 0.5, size=(33, 3))
+    fixtures = []
+    for _ in range(count):
+        landmarks = landmark_pb2.LandmarkList()
+        for x, y, z in base + rng.normal(0, 0.01, size=base.shape):
+            landmark = landmarks.landmark.add()
+            landmark.x, landmark.y, landmark.z = x, y, z
+        fixtures.append(landmarks)
+    return fixtures
+
+# Each case builds its fixtures and returns (call, cleanup)
+
+def case_smoother():
+    smoother = LandmarkSmoother()
+    fixtures = synthetic_landmarks(64)
+    state = {"i": 0}
+    def call():
+        state["i"] += 1
+        smoother.smooth(fixtures[state["i"] % len(fixtures)], time.time())
+    return call, None
+
+def case_serialization():
+    landmarks = synthetic_landmarks(1)[0]
+    return (lambda: format_landmark_message(landmarks)), None
+
+def case_frame_buffer():
+    frame_buffer = FrameBuffer()
+    chunk = synthetic_jpeg(*CAMERA_SIZE)
+    def call():
+        frame_buffer.clear()
+        frame_buffer.add(chunk)
+        frame_buffer.get_copy()
+    return call, None
+
+def case_get_frame():
+    global_vars.HOST = '127.0.0.1'
+    receiver = UDPFrameReceiver(0)  # Never started, frames are queued directly
+    jpeg = synthetic_jpeg(*CAMERA_SIZE)
+    def call():
+        receiver.queue_frame(jpeg)
+        receiver.get_frame()
+    return call, receiver.cleanup
+
+def case_udp_send():
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.setblocking(False)
+    client = ClientUDP('127.0.0.1', sink.getsockname()[1])
+    client.connect()
+    message = format_landmark_message(synthetic_landmarks(1)[0])
+    def call():
+        client._send_message_direct(message)
+        try:
+            sink.recv(65536)  # Keep the sink's receive buffer from filling up
+        except BlockingIOError:
+            pass
+    def cleanup():
+        client.disconnect()
+        sink.close()
+    return call, cleanup
+
+def case_broadcast_message():
+    sys.path.insert(0, os.path.abspath(BITMAPSTREAM_DIR))
+    from bitmap import encode_frame_message  # Needs the bitmapstream requirements
+    jpeg = synthetic_jpeg(1280, 720)
+    def call():
+        message = {
+            "type": "bitmap_frame", "client_id": "unity_bench", "frame_number": 1,
+            "timestamp": time.time(), "resolution": "1280x720", "data_type": "image/jpeg",
+            "compression": "none", "quality": "source"
+        }
+        encode_frame_message(message, jpeg)
+    return call, None
+
+CASES = {
+    "smoother": case_smoother,
+    "serialization": case_serialization,
+    "frame_buffer": case_frame_buffer,
+    "get_frame": case_get_frame,
+    "udp_send": case_udp_send,
+    "broadcast_message": case_broadcast_message,
+}
+
+def measure(call, seconds):
+    for _ in range(WARMUP_CALLS):
+        call()
+
+    latencies = []
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        start = time.perf_counter_ns()
+        call()
+        latencies.append(time.perf_counter_ns() - start)
+    latencies = np.array(latencies, dtype=np.float64) / 1000.0  # Microseconds
+
+    # Peak transient allocation per call, measured separately (tracemalloc slows calls down)
+    tracemalloc.start()
+    peaks = []
+    for _ in range(ALLOCATION_CALLS):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    return {
+        "calls": len(latencies),
+        "ops_per_sec": float(len(latencies) / (latencies.sum() / 1e6)),
+        "p50_us": float(np.percentile(latencies, 50)),
+        "p95_us": float(np.percentile(latencies, 95)),
+        "p99_us": float(np.percentile(latencies, 99)),
+        "alloc_bytes": float(np.median(peaks)),
+    }
+
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_sec']:.0f} ops/s vs baseline {reference['ops_per_sec']:.0f}")
+        # Small absolute slack so a few bytes of noise never fail the run
+        if result["alloc_bytes"] > reference["alloc_bytes"] * (1 + threshold) + 256:
+            regressions.append(f"{name}: {result['alloc_bytes']:.0f} B/call vs baseline {reference['alloc_bytes']:.0f}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Hot-path microbenchmarks')
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='Run only these cases')
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS, help='Measurement time per case')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative regression allowed before failing (0.2 = 20%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+    parser.add_argument('--output', help='Also write results as JSON to this file')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = {}
+    print(f"{'case':<20}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'alloc B':>10}")
+    for name in args.only or CASES:
+        try:
+            call, cleanup = CASES[name]()
+        except ImportError as e:
+            print(f"{name:<20}skipped: {e}")
+            continue
+        try:
+            result = results[name] = measure(call, args.seconds)
+        finally:
+            if cleanup:
+                cleanup()
+        print(f"{name:<20}{result['ops_per_sec']:>12.0f}{result['p50_us']:>10.1f}"
+              f"{result['p95_us']:>10.1f}{result['p99_us']:>10.1f}{result['alloc_bytes']:>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        # Baselines are per machine, so none ships; failing keeps a missing one from passing the gate
+        print(f"❌ No baseline at {args.baseline}, nothing to compare against. "
+              f"Record one on this machine with --save-baseline")
+        sys.exit(2)
+
+    with open(args.baseline) as f:
+        regressions = find_regressions(results, json.load(f), args.threshold)
+    if regressions:
+        print("❌ Regressions past threshold:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,9 @@ import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 from clientUDP import ClientUDP
+from landmark_tap import LandmarkTap
+from fec import FEC_MAGIC, FECFrameDecoder
+from shm_camera import SharedFrameReceiver
 import cv2
 import threading
 import time
@@ -25,6 +28,46 @@ MAX_QUEUE_SIZE = 2  # Further reduced for lower latency
 SMOOTHING_FACTOR = 0.7
 MIN_MOVEMENT_THRESHOLD = 0.001
 
+# Output prediction parameters (see output_scheduler.py)
+MAX_EXTRAPOLATION = 0.1  # Never predict further than this past the last sample
+STALE_SAMPLE_AFTER = 1.0  # Samples older than this are not output (person left)
+
+# Motion gate parameters
+MOTION_THUMBNAIL_SIZE = (32, 24)
+MOTION_PIXEL_DELTA = 10  # Grayscale difference (0-255) for a thumbnail pixel to count as changed
+MOTION_MIN_CHANGED_PIXELS = 6  # Changed pixels (of 768) counted as motion, about one hand at 640x480
+PRESENT_FORCE_INTERVAL = 0.25  # Forced inference while a person is tracked and still
+EMPTY_TIMEOUT = 2.0  # Seconds without a detection before the scene counts as empty
+EMPTY_FORCE_INTERVAL = 1.0  # Forced inference while the scene is empty and static
+
+def create_pose(static_image_mode=False):
+    """MediaPipe pose model with the settings used for live tracking"""
+    return mp.solutions.pose.Pose(
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=0,
+        static_image_mode=static_image_mode,
+        enable_segmentation=False,
+        smooth_landmarks=True
+    )
+
+def resize_for_processing(frame):
+    return cv2.resize(frame, (PROCESS_WIDTH, PROCESS_HEIGHT), interpolation=cv2.INTER_LINEAR)
+
+def infer_landmarks(pose, frame):
+    """World landmarks of a BGR frame, None if nobody was detected"""
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    image.flags.writeable = False
+    return pose.process(image).pose_world_landmarks
+
+def format_landmark_message(landmarks):
+    """Unity text format: one `index|x|y|z` line per landmark"""
+    return format_landmark_points((landmark.x, landmark.y, landmark.z) for landmark in landmarks.landmark[:33])
+
+def format_landmark_points(points):
+    """Unity text format from (x, y, z) points, also used by the output scheduler"""
+    return "".join(f"{i}|{x:.6f}|{y:.6f}|{z:.6f}\n" for i, (x, y, z) in enumerate(points))
+
 class FrameBuffer:
     def __init__(self, max_size=MAX_BUFFER_SIZE):
         self.buffer = bytearray()
@@ -50,7 +93,7 @@ class FrameBuffer:
 
 class UDPFrameReceiver(threading.Thread):
     def __init__(self, port):
-        super().__init__()
+        super().__init__(name=f"UDPFrameReceiver-{port}")
         self.port = port
         self.frame_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
         self.isRunning = False
@@ -62,6 +105,8 @@ class UDPFrameReceiver(threading.Thread):
         self.init_socket()
         
         self.frame_buffer = FrameBuffer()
+        self.fec_decoder = FECFrameDecoder()
+        self.last_timestamp = None  # Arrival time of the frame last returned by get_frame
         self.frame_count = 0
         self.last_stats_time = time.time()
         print(f"{DEBUG_PREFIX}UDP receiver initialized on port {self.port}")
@@ -89,20 +134,17 @@ class UDPFrameReceiver(threading.Thread):
                 data, addr = self.sock.recvfrom(65536)
                 consecutive_timeouts = 0
                 
-                if data.startswith(b'FRAME_START'):
+                if data.startswith(FEC_MAGIC):
+                    frame_data = self.fec_decoder.add(data)
+                    if frame_data is not None:
+                        self.queue_frame(frame_data)
+                        self.frame_count += 1
+                elif data.startswith(b'FRAME_START'):
                     self.frame_buffer.clear()
                 elif data.startswith(b'FRAME_END'):
                     frame_data = self.frame_buffer.get_copy()
                     if len(frame_data) > 0:
-                        try:
-                            self.frame_queue.put_nowait(frame_data)
-                        except queue.Full:
-                            # Remove oldest frame and add new one
-                            try:
-                                self.frame_queue.get_nowait()
-                                self.frame_queue.put_nowait(frame_data)
-                            except queue.Empty:
-                                pass
+                        self.queue_frame(frame_data)
                     self.frame_count += 1
                 else:
                     self.frame_buffer.add(data)
@@ -112,7 +154,11 @@ class UDPFrameReceiver(threading.Thread):
                 if current_time - self.last_stats_time >= 3:
                     fps = self.frame_count / 3
                     queue_size = self.frame_queue.qsize()
-                    print(f"{DEBUG_PREFIX}Port {self.port}: {fps:.1f} FPS, Queue: {queue_size}")
+                    fec_stats = ""
+                    if self.fec_decoder.last_frame_id >= 0:
+                        fec_stats = (f", FEC recovered: {self.fec_decoder.frames_recovered}"
+                                     f", unrecoverable: {self.fec_decoder.frames_unrecoverable}")
+                    print(f"{DEBUG_PREFIX}Port {self.port}: {fps:.1f} FPS, Queue: {queue_size}{fec_stats}")
                     self.frame_count = 0
                     self.last_stats_time = current_time
 
@@ -125,6 +171,18 @@ class UDPFrameReceiver(threading.Thread):
                 
         self.cleanup()
 
+    def queue_frame(self, frame_data):
+        item = (frame_data, time.time())
+        try:
+            self.frame_queue.put_nowait(item)
+        except queue.Full:
+            # Remove oldest frame and add new one
+            try:
+                self.frame_queue.get_nowait()
+                self.frame_queue.put_nowait(item)
+            except queue.Empty:
+                pass
+
     def cleanup(self):
         self.isRunning = False
         if self.sock:
@@ -133,12 +191,11 @@ class UDPFrameReceiver(threading.Thread):
 
     def get_frame(self):
         try:
-            frame_data = self.frame_queue.get_nowait()
+            frame_data, self.last_timestamp = self.frame_queue.get_nowait()
             np_arr = np.frombuffer(frame_data, np.uint8)
             frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
             if frame is not None:
-                frame = cv2.resize(frame, (PROCESS_WIDTH, PROCESS_HEIGHT), 
-                                 interpolation=cv2.INTER_LINEAR)
+                frame = resize_for_processing(frame)
             return frame
         except queue.Empty:
             return None
@@ -157,7 +214,53 @@ class LandmarkSmoother:
         self.movement_threshold = MIN_MOVEMENT_THRESHOLD
         self.lock = threading.Lock()
 
-    def smooth(self, landmarks):
+        # Motion state for the fixed-rate output scheduler
+        self.timestamp = None  # Freshness: last sample or motion gate hold
+        self.sample_time = None  # When the current sample was actually measured
+        self.sample = None
+        self.sample_interval = 0.0
+        self.velocity = None
+
+    def record_sample(self, points, timestamp):
+        """Velocity from the previous smoothed sample (caller holds the lock)"""
+        points = np.asarray(points, dtype=np.float64)
+        if self.sample_time is not None:
+            dt = timestamp - self.sample_time
+            if 0 < dt < STALE_SAMPLE_AFTER:
+                self.velocity = (points - self.sample) / dt
+                self.sample_interval = dt
+            else:
+                self.velocity = None
+        self.sample = points
+        self.sample_time = timestamp
+        self.timestamp = timestamp
+
+    def hold(self, timestamp):
+        """Scene is static: keep the current pose, fresh and without motion
+
+        Only the freshness timestamp moves, the next sample's velocity is still
+        measured from the last real sample.
+        """
+        with self.lock:
+            if self.timestamp is not None:
+                self.timestamp = timestamp
+                self.velocity = None
+
+    def predict(self, target_time, max_extrapolation=MAX_EXTRAPOLATION):
+        """Pose at `target_time` as a 33x3 array, None if there is no recent sample
+
+        Times between the last two samples are interpolated, later times are
+        extrapolated along the velocity for at most `max_extrapolation` seconds.
+        """
+        with self.lock:
+            if self.timestamp is None or target_time - self.timestamp > STALE_SAMPLE_AFTER:
+                return None
+            if self.velocity is None:
+                return self.sample
+            dt = min(max(target_time - self.sample_time, -self.sample_interval), max_extrapolation)
+            return self.sample + self.velocity * dt
+
+    def smooth(self, landmarks, timestamp=None):
         with self.lock:
             if landmarks is None:
                 return self.stable_landmarks
@@ -169,6 +272,7 @@ class LandmarkSmoother:
             if self.previous_landmarks is None:
                 self.previous_landmarks = current_landmarks
                 self.stable_landmarks = current_landmarks
+                self.record_sample(current_landmarks, timestamp or time.time())
                 return landmarks
 
             # Apply smoothing
@@ -188,6 +292,7 @@ class LandmarkSmoother:
 
             self.previous_landmarks = smoothed_landmarks
             self.stable_landmarks = smoothed_landmarks
+            self.record_sample(smoothed_landmarks, timestamp or time.time())
 
             # Create new landmark list with smoothed values
             smoothed_result = type(landmarks)()
@@ -199,14 +304,62 @@ class LandmarkSmoother:
 
             return smoothed_result
 
+class MotionGate:
+    """Decides whether a frame is worth running pose inference on
+
+    A tiny grayscale thumbnail is compared with the one of the last inferred
+    frame, so slow drift still adds up to motion. Motion is a count of changed
+    pixels rather than a mean, so a moving hand or a head turn passes even
+    though most of the frame is still. Static frames are skipped,
+    with a forced inference every so often (rarer once nobody has been seen
+    for a while) so people walking in are never missed.
+    """
+    def __init__(self, pixel_delta=MOTION_PIXEL_DELTA, min_changed_pixels=MOTION_MIN_CHANGED_PIXELS):
+        self.pixel_delta = pixel_delta
+        self.min_changed_pixels = min_changed_pixels
+        self.reference = None
+        self.last_inference = 0.0
+        self.last_detection = 0.0
+        self.skipped = 0
+
+    def thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, MOTION_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def person_present(self, now):
+        return now - self.last_detection < EMPTY_TIMEOUT
+
+    def should_infer(self, frame, now):
+        thumbnail = self.thumbnail(frame)
+        force_interval = PRESENT_FORCE_INTERVAL if self.person_present(now) else EMPTY_FORCE_INTERVAL
+
+        if (self.reference is None
+                or now - self.last_inference >= force_interval
+                or np.count_nonzero(np.abs(thumbnail - self.reference) > self.pixel_delta) >= self.min_changed_pixels):
+            self.reference = thumbnail
+            self.last_inference = now
+            return True
+
+        self.skipped += 1
+        return False
+
+    def detected(self, now):
+        self.last_detection = now
+
 class BodyThread(threading.Thread):
-    def __init__(self, input_port, output_port):
-        super().__init__()
+    def __init__(self, input_port, output_port, subscribers=None):
+        super().__init__(name=f"BodyThread-{input_port}")
         self.input_port = input_port
         self.output_port = output_port
+        self.subscribers = subscribers
         self.receiver = None
         self.client = None
+        self.landmark_tap = None
         self.smoother = LandmarkSmoother()
+        self.motion_gate = MotionGate() if global_vars.USE_MOTION_GATE else None
+        self.last_data_string = None
+        # With a fixed output rate the OutputScheduler sends predictions from the smoother
+        self.scheduled_output = bool(global_vars.OUTPUT_RATE or global_vars.MULTIPLEX_OUTPUT_PORT)
         self.should_stop = False
         self.daemon = True
         
@@ -220,27 +373,27 @@ class BodyThread(threading.Thread):
     def run(self):
         try:
             # Initialize components
-            self.receiver = UDPFrameReceiver(self.input_port)
-            self.client = ClientUDP(global_vars.OUTPUT_HOST, self.output_port)
+            if self.input_port in global_vars.LOCAL_CAMERA_PORTS:
+                self.receiver = SharedFrameReceiver(self.input_port, PROCESS_WIDTH, PROCESS_HEIGHT)
+            else:
+                self.receiver = UDPFrameReceiver(self.input_port)
+            # Multiplexed output goes through the OutputScheduler's single socket
+            if not global_vars.MULTIPLEX_OUTPUT_PORT:
+                self.client = ClientUDP(global_vars.OUTPUT_HOST, self.output_port)
+                self.client.name = f"ClientUDP-{self.input_port}"
+            if global_vars.LANDMARK_TAP_HOST:
+                self.landmark_tap = LandmarkTap(global_vars.LANDMARK_TAP_HOST, global_vars.LANDMARK_TAP_PORT, self.input_port)
             
             # Start threads
             self.receiver.start()
-            self.client.start()
+            if self.client:
+                self.client.start()
             
             # Wait a bit for initialization
             time.sleep(0.5)
             
-            mp_pose = mp.solutions.pose
-
             # Optimized pose settings
-            with mp_pose.Pose(
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5,
-                model_complexity=0,
-                static_image_mode=False,
-                enable_segmentation=False,
-                smooth_landmarks=True
-            ) as pose:
+            with create_pose() as pose:
                 print(f"{DEBUG_PREFIX}Pose model started on port {self.input_port}")
 
                 consecutive_failures = 0
@@ -258,25 +411,33 @@ class BodyThread(threading.Thread):
                     no_frame_count = 0
                     consecutive_failures = 0
                     start_time = time.time()
+                    frame_time = self.receiver.last_timestamp  # Capture (arrival) time, not processing time
+
+                    if self.motion_gate and not self.motion_gate.should_infer(frame, start_time):
+                        # Nothing moved: hold the last landmarks while someone is in view
+                        if self.motion_gate.person_present(start_time):
+                            if self.scheduled_output:
+                                self.smoother.hold(start_time)
+                            elif self.last_data_string:
+                                self.send_data(self.last_data_string)
+                        continue
 
                     try:
                         # Process frame
-                        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        image.flags.writeable = False
-                        results = pose.process(image)
-
-                        if results.pose_world_landmarks:
-                            smoothed_landmarks = self.smoother.smooth(results.pose_world_landmarks)
-                            
-                            if smoothed_landmarks:
-                                # Build data string more efficiently
-                                data_parts = []
-                                for i in range(33):
-                                    landmark = smoothed_landmarks.landmark[i]
-                                    data_parts.append(f"{i}|{landmark.x:.6f}|{landmark.y:.6f}|{landmark.z:.6f}")
-                                
-                                data_string = "\n".join(data_parts) + "\n"
+                        world_landmarks = infer_landmarks(pose, frame)
+
+                        if world_landmarks:
+                            if self.motion_gate:
+                                self.motion_gate.detected(start_time)
+                            smoothed_landmarks = self.smoother.smooth(world_landmarks, frame_time)
+
+                            if smoothed_landmarks and not self.scheduled_output:
+                                data_string = format_landmark_message(smoothed_landmarks)
                                 self.send_data(data_string)
+                                self.last_data_string = data_string
+
+                            if smoothed_landmarks and self.landmark_tap:
+                                self.landmark_tap.send(smoothed_landmarks, frame_time)
 
                     except Exception as e:
                         print(f"{DEBUG_PREFIX}Processing error on port {self.input_port}: {e}")
@@ -292,7 +453,11 @@ class BodyThread(threading.Thread):
                     if current_time - self.last_stats_time >= 5:
                         avg_time = sum(self.processing_times) / len(self.processing_times) if self.processing_times else 0
                         fps = self.frame_count / 5
-                        print(f"{DEBUG_PREFIX}Port {self.input_port}: {fps:.1f} FPS, avg process: {avg_time*1000:.1f}ms")
+                        skipped = ""
+                        if self.motion_gate:
+                            skipped = f", skipped (static): {self.motion_gate.skipped}"
+                            self.motion_gate.skipped = 0
+                        print(f"{DEBUG_PREFIX}Port {self.input_port}: {fps:.1f} FPS, avg process: {avg_time*1000:.1f}ms{skipped}")
                         self.frame_count = 0
                         self.last_stats_time = current_time
 
@@ -305,6 +470,8 @@ class BodyThread(threading.Thread):
         try:
             if self.client and self.client.isConnected():
                 self.client.sendMessage(message)
+            if self.subscribers:
+                self.subscribers.publish_text(self.input_port, self.output_port, message)
         except Exception as e:
             print(f"{DEBUG_PREFIX}Send error to {global_vars.OUTPUT_HOST}:{self.output_port}: {e}")
 
@@ -319,5 +486,8 @@ class BodyThread(threading.Thread):
         
         if self.client:
             self.client.stop()
+        
+        if self.landmark_tap:
+            self.landmark_tap.close()
             
         print(f"{DEBUG_PREFIX}Body thread stopped: {self.input_port}")
\ No newline at end of file
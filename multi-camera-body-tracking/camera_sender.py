@@ -2,10 +2,59 @@ import cv2
 import socket
 import time
 import global_vars
+import fec
+from shm_camera import SharedCameraRing
 
 # Maximum size per UDP packet (safe limit)
 MAX_UDP_PACKET_SIZE = 65000
 
+# Re-attach to the shared-memory ring this often, in case main.py was restarted
+RING_REATTACH_INTERVAL = 2.0
+
+def attach_ring(port):
+    """Wait for the body thread of `port` to create its ring"""
+    while not global_vars.KILL_THREADS:
+        try:
+            return SharedCameraRing(port)
+        except FileNotFoundError:
+            time.sleep(0.5)
+    return None
+
+# Same-host sender: raw frames at processing resolution, no JPEG and no UDP
+def write_camera_frames(cap, port):
+    print(f"{global_vars.DEBUG_PREFIX}Waiting for shared-memory ring of port {port}")
+    ring = attach_ring(port)
+    attached_at = time.time()
+    if ring:
+        print(f"{global_vars.DEBUG_PREFIX}Writing {ring.width}x{ring.height} frames to port {port} ring")
+
+    frames = 0
+    last_stats_time = time.time()
+    while ring and not global_vars.KILL_THREADS:
+        ret, frame = cap.read()
+        if not ret:
+            print(f"{global_vars.DEBUG_PREFIX}Failed to capture frame")
+            continue
+
+        captured = time.time()
+        if frame.shape[1] != ring.width or frame.shape[0] != ring.height:
+            frame = cv2.resize(frame, (ring.width, ring.height), interpolation=cv2.INTER_LINEAR)
+        ring.write(frame, captured)
+        frames += 1
+
+        if captured - attached_at >= RING_REATTACH_INTERVAL:
+            ring.close()
+            ring = attach_ring(port)
+            attached_at = captured
+
+        if captured - last_stats_time >= 5:
+            print(f"{global_vars.DEBUG_PREFIX}Shared-memory sender: {frames / (captured - last_stats_time):.1f} FPS")
+            frames = 0
+            last_stats_time = captured
+
+    if ring:
+        ring.close()
+
 # UDP sender for camera frames
 def send_camera_frames():
     cap = cv2.VideoCapture(global_vars.CAM_INDEX)
@@ -15,6 +64,14 @@ def send_camera_frames():
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, global_vars.HEIGHT)
     print(f"{global_vars.DEBUG_PREFIX}Camera opened at {cap.get(cv2.CAP_PROP_FPS)} fps")
 
+    if global_vars.LOCAL_SENDER_PORT is not None:
+        try:
+            write_camera_frames(cap, global_vars.LOCAL_SENDER_PORT)
+        finally:
+            cap.release()
+            print(f"{global_vars.DEBUG_PREFIX}Camera sender stopped")
+        return
+
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     targets = [
                ("192.168.255.198", 52701),
@@ -22,6 +79,12 @@ def send_camera_frames():
 
     print(f"{global_vars.DEBUG_PREFIX}UDP sender targeting {targets}")
 
+    if global_vars.FEC_MODE:
+        parity = fec.parity_count(global_vars.FEC_MODE, global_vars.FEC_GROUP_SIZE, global_vars.FEC_OVERHEAD)
+        print(f"{global_vars.DEBUG_PREFIX}FEC {global_vars.FEC_MODE}: {global_vars.FEC_GROUP_SIZE} data + {parity} parity "
+              f"fragments of {global_vars.FEC_FRAGMENT_SIZE} bytes")
+    frame_id = 0
+
     try:
         while not global_vars.KILL_THREADS:
             ret, frame = cap.read()
@@ -32,19 +95,29 @@ def send_camera_frames():
             _, jpeg = cv2.imencode('.jpg', frame)
             data = jpeg.tobytes()
 
-            for target in targets:
-                sock.sendto(b'FRAME_START', target)
+            if global_vars.FEC_MODE:
+                packets = fec.encode_frame(frame_id, data, global_vars.FEC_MODE, global_vars.FEC_GROUP_SIZE,
+                                           parity, global_vars.FEC_FRAGMENT_SIZE)
+                for packet in packets:
+                    for target in targets:
+                        sock.sendto(packet, target)
+                frame_id += 1
 
-            # Send data in chunks to all targets
-            for i in range(0, len(data), MAX_UDP_PACKET_SIZE):
-                chunk = data[i:i + MAX_UDP_PACKET_SIZE]
+                print(f"{global_vars.DEBUG_PREFIX}Sent frame to all targets in {len(packets)} FEC packets (total {len(data)} bytes)")
+            else:
                 for target in targets:
-                    sock.sendto(chunk, target)
+                    sock.sendto(b'FRAME_START', target)
+
+                # Send data in chunks to all targets
+                for i in range(0, len(data), MAX_UDP_PACKET_SIZE):
+                    chunk = data[i:i + MAX_UDP_PACKET_SIZE]
+                    for target in targets:
+                        sock.sendto(chunk, target)
 
-            for target in targets:
-                sock.sendto(b'FRAME_END', target)
+                for target in targets:
+                    sock.sendto(b'FRAME_END', target)
 
-            print(f"{global_vars.DEBUG_PREFIX}Sent frame to all targets in {len(data) // MAX_UDP_PACKET_SIZE + 1} chunks (total {len(data)} bytes)")
+                print(f"{global_vars.DEBUG_PREFIX}Sent frame to all targets in {len(data) // MAX_UDP_PACKET_SIZE + 1} chunks (total {len(data)} bytes)")
 
             time.sleep(0.01)  # Adjust as needed
 
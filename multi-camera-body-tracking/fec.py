@@ -0,0 +1,218 @@
+import struct
+import numpy as np
+
+# Forward error correction for camera frames over UDP.
+# A frame is cut into MTU-sized data fragments, grouped k at a time, and each
+# group gets m parity fragments. Any k of a group's k+m fragments rebuild it.
+#   xor: m = 1, parity is the XOR of the group (cheap, survives one loss)
+#   rs:  Reed-Solomon (Cauchy) over GF(256), survives any m losses per group
+FEC_MAGIC = b'FEC1'
+FEC_HEADER = struct.Struct('<4sIIHHHBBBB')  # magic, frame id, frame size, fragment size, group, group count, k, m, index, scheme
+SCHEME_XOR = 0
+SCHEME_RS = 1
+SCHEMES = {'xor': SCHEME_XOR, 'rs': SCHEME_RS}
+
+DEFAULT_FRAGMENT_SIZE = 1200  # Fits a 1500 byte MTU with IP/UDP/FEC headers
+MAX_PENDING_FRAMES = 4  # Incomplete frames kept before the oldest is given up
+RESTART_GAP = 300  # Frame ids this far behind mean the sender restarted
+
+# GF(256) arithmetic, primitive polynomial x^8 + x^4 + x^3 + x^2 + 1
+GF_EXP = np.zeros(512, dtype=np.int32)
+GF_LOG = np.zeros(256, dtype=np.int32)
+_value = 1
+for _power in range(255):
+    GF_EXP[_power] = _value
+    GF_LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11d
+GF_EXP[255:510] = GF_EXP[:255]
+
+# Full multiplication table so a fragment is scaled with one fancy-index
+_logs = GF_LOG[1:]
+GF_MUL = np.zeros((256, 256), dtype=np.uint8)
+GF_MUL[1:, 1:] = GF_EXP[_logs[:, None] + _logs[None, :]]
+
+def gf_mul(a, b):
+    return int(GF_MUL[a, b])
+
+def gf_inv(a):
+    return int(GF_EXP[255 - GF_LOG[a]])
+
+def cauchy_row(parity_index, k, m):
+    """Coefficients of parity fragment `parity_index` over k data fragments"""
+    x = k + parity_index
+    return [gf_inv(x ^ j) for j in range(k)]
+
+def gf_invert_matrix(matrix):
+    """Gauss-Jordan inversion of a small square matrix over GF(256)"""
+    size = len(matrix)
+    work = [list(row) + [1 if i == j else 0 for j in range(size)] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next(row for row in range(col, size) if work[row][col])
+        work[col], work[pivot] = work[pivot], work[col]
+        scale = gf_inv(work[col][col])
+        work[col] = [gf_mul(value, scale) for value in work[col]]
+        for row in range(size):
+            factor = work[row][col]
+            if row != col and factor:
+                work[row] = [value ^ gf_mul(factor, pivot_value) for value, pivot_value in zip(work[row], work[col])]
+    return [row[size:] for row in work]
+
+def parity_count(scheme, k, overhead):
+    """Parity fragments per group for an overhead ratio (parity / data)"""
+    if SCHEMES[scheme] == SCHEME_XOR:
+        return 1
+    return max(1, min(255 - k, round(k * overhead)))
+
+def encode_frame(frame_id, data, scheme='xor', k=10, m=1, fragment_size=DEFAULT_FRAGMENT_SIZE):
+    """Split a frame into data + parity packets ready for sendto"""
+    scheme_id = SCHEMES[scheme]
+    if scheme_id == SCHEME_XOR:
+        m = 1
+    frame_size = len(data)
+    fragment_count = max(1, -(-frame_size // fragment_size))
+    group_count = -(-fragment_count // k)
+
+    padded = np.zeros(fragment_count * fragment_size, dtype=np.uint8)
+    padded[:frame_size] = np.frombuffer(data, dtype=np.uint8)
+    fragments = padded.reshape(fragment_count, fragment_size)
+
+    packets = []
+    for group in range(group_count):
+        group_fragments = fragments[group * k:(group + 1) * k]
+        group_k = len(group_fragments)
+
+        def header(index):
+            return FEC_HEADER.pack(FEC_MAGIC, frame_id, frame_size, fragment_size,
+                                   group, group_count, group_k, m, index, scheme_id)
+
+        for index, fragment in enumerate(group_fragments):
+            packets.append(header(index) + fragment.tobytes())
+
+        if scheme_id == SCHEME_XOR:
+            parity = np.bitwise_xor.reduce(group_fragments, axis=0)
+            packets.append(header(group_k) + parity.tobytes())
+        else:
+            for parity_index in range(m):
+                parity = np.zeros(fragment_size, dtype=np.uint8)
+                for coefficient, fragment in zip(cauchy_row(parity_index, group_k, m), group_fragments):
+                    parity ^= GF_MUL[coefficient][fragment]
+                packets.append(header(group_k + parity_index) + parity.tobytes())
+    return packets
+
+def decode_group(fragments, k, m, scheme_id):
+    """Rebuild the k data fragments of a group from any k received fragments"""
+    missing = [index for index in range(k) if index not in fragments]
+    if not missing:
+        return [fragments[index] for index in range(k)]
+
+    if scheme_id == SCHEME_XOR:
+        parity = fragments[k]
+        others = [fragments[index] for index in range(k) if index in fragments]
+        rebuilt = np.bitwise_xor.reduce([parity] + others, axis=0)
+        fragments = dict(fragments)
+        fragments[missing[0]] = rebuilt
+        return [fragments[index] for index in range(k)]
+
+    # Rows of the systematic generator for the first k fragments we have
+    rows = sorted(fragments.keys())[:k]
+    generator = []
+    for index in rows:
+        if index < k:
+            generator.append([1 if j == index else 0 for j in range(k)])
+        else:
+            generator.append(cauchy_row(index - k, k, m))
+    inverse = gf_invert_matrix(generator)
+
+    data = {index: fragments[index] for index in range(k) if index in fragments}
+    for index in missing:
+        rebuilt = np.zeros_like(fragments[rows[0]])
+        for coefficient, row in zip(inverse[index], rows):
+            if coefficient:
+                rebuilt ^= GF_MUL[coefficient][fragments[row]]
+        data[index] = rebuilt
+    return [data[index] for index in range(k)]
+
+class FECFrame:
+    """Fragments of one frame collected so far"""
+    def __init__(self, frame_size, fragment_size, group_count, scheme_id):
+        self.frame_size = frame_size
+        self.fragment_size = fragment_size
+        self.scheme_id = scheme_id
+        self.groups = [dict() for _ in range(group_count)]
+        self.group_k = [0] * group_count
+        self.group_m = [0] * group_count
+        self.lost_data = False
+
+    def add(self, group, k, m, index, payload):
+        self.group_k[group] = k
+        self.group_m[group] = m
+        self.groups[group][index] = np.frombuffer(payload, dtype=np.uint8)
+
+    def complete(self):
+        return all(k and len(fragments) >= k for fragments, k in zip(self.groups, self.group_k))
+
+    def assemble(self):
+        parts = []
+        for fragments, k, m in zip(self.groups, self.group_k, self.group_m):
+            if any(index not in fragments for index in range(k)):
+                self.lost_data = True
+            parts.extend(decode_group(fragments, k, m, self.scheme_id))
+        return np.concatenate(parts).tobytes()[:self.frame_size]
+
+class FECFrameDecoder:
+    """Receiver side: rebuilds frames from any sufficient subset of fragments"""
+    def __init__(self, max_pending=MAX_PENDING_FRAMES):
+        self.max_pending = max_pending
+        self.pending = {}
+        self.last_frame_id = -1
+        self.frames_complete = 0
+        self.frames_recovered = 0
+        self.frames_unrecoverable = 0
+
+    def add(self, packet):
+        """Feed one packet, returns the frame bytes once it can be rebuilt"""
+        if len(packet) < FEC_HEADER.size:
+            return None
+        (magic, frame_id, frame_size, fragment_size, group, group_count,
+         k, m, index, scheme_id) = FEC_HEADER.unpack_from(packet, 0)
+        if magic != FEC_MAGIC:
+            return None
+        if frame_id <= self.last_frame_id:
+            if self.last_frame_id - frame_id < RESTART_GAP:
+                return None  # Late fragment of a frame already delivered or given up
+            self.pending.clear()
+            self.last_frame_id = -1
+        payload = packet[FEC_HEADER.size:]
+        if len(payload) != fragment_size or group >= group_count:
+            return None
+
+        frame = self.pending.get(frame_id)
+        if frame is None:
+            frame = self.pending[frame_id] = FECFrame(frame_size, fragment_size, group_count, scheme_id)
+            self.evict_stale()
+        frame.add(group, k, m, index, payload)
+
+        if not frame.complete():
+            return None
+
+        del self.pending[frame_id]
+        # Older incomplete frames can no longer be shown
+        for stale_id in [pending_id for pending_id in self.pending if pending_id < frame_id]:
+            del self.pending[stale_id]
+            self.frames_unrecoverable += 1
+        self.last_frame_id = frame_id
+
+        data = frame.assemble()
+        if frame.lost_data:
+            self.frames_recovered += 1
+        else:
+            self.frames_complete += 1
+        return data
+
+    def evict_stale(self):
+        while len(self.pending) > self.max_pending:
+            oldest = min(self.pending)
+            del self.pending[oldest]
+            self.frames_unrecoverable += 1
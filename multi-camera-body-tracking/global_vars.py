@@ -19,12 +19,49 @@ FPS = 60
 WIDTH = 320
 HEIGHT = 240
 
+# Send landmarks to Unity on a fixed clock (Hz), predicted from the latest samples (None: send after each inference)
+OUTPUT_RATE = None
+PREDICTION_HORIZON = 0.0  # Seconds ahead of now to predict; negative values interpolate between samples instead
+# Send all cameras in one binary datagram per tick to this single Unity port (None: one text port per camera)
+MULTIPLEX_OUTPUT_PORT = None
+DEFAULT_MULTIPLEX_RATE = 60  # Tick rate when multiplexing without OUTPUT_RATE
+
+# Skip pose inference on frames that barely changed (static or empty scene), holding the last landmarks.
+# Off until MOTION_PIXEL_DELTA / MOTION_MIN_CHANGED_PIXELS in body.py are tuned for the cameras in use
+USE_MOTION_GATE = False
+
 # [0, 2] Higher numbers are more precise, but also cost more performance. The demo video used 2 (good environment is more important).
 MODEL_COMPLEXITY = 0
 
 # List of input UDP ports for camera feeds
 INPUT_PORTS = [62700, 62701, 62702, 62703, 62704, 62705, 62706, 62707]
 
+# Same-host cameras: input ports read from a shared-memory ring of raw frames instead of UDP
+LOCAL_CAMERA_PORTS = []
+# Set on the camera_sender side to write into that port's ring instead of sending over UDP
+LOCAL_SENDER_PORT = None
+
+# Forward error correction for camera frames (None to send plain FRAME_START/chunks/FRAME_END)
+# 'xor' survives one lost fragment per group, 'rs' (Reed-Solomon) survives FEC_OVERHEAD * group size
+FEC_MODE = None
+FEC_FRAGMENT_SIZE = 1200  # MTU-sized fragments, no IP fragmentation
+FEC_GROUP_SIZE = 10  # Data fragments per parity group
+FEC_OVERHEAD = 0.2  # Parity / data ratio for 'rs'
+
+# Extra landmark consumers (recorders, more Unity instances) register on this UDP control port (None to disable)
+SUBSCRIBER_CONTROL_PORT = None
+MULTICAST_GROUP = None  # e.g. '239.255.42.99': also send every message once to this group (same ports as Unity)
+
+# On-demand sampling profiler: send SIGUSR1, or {"op": "profile"} to SUBSCRIBER_CONTROL_PORT
+PROFILE_SECONDS = 10
+PROFILE_RATE = 100  # Stack samples per second
+PROFILE_TRACEMALLOC = False  # Also write an allocation snapshot (slows the server while tracing)
+PROFILE_DIR = 'profiles'
+
+# Optional compact landmark tap to the bitmap server for skeleton streams (None to disable)
+LANDMARK_TAP_HOST = None
+LANDMARK_TAP_PORT = 52782
+
 # Function to get output port for a given input port
 get_output_port = lambda input_port: input_port + 33
 
@@ -0,0 +1,44 @@
+import socket
+import struct
+import time
+
+# Compact binary landmark packet for the bitmap server's skeleton streams
+# (must match bitmapstream/skeleton.py):
+#   magic 'GTLM', version, landmark count, camera id, sequence, capture timestamp
+#   followed by count * (x, y, z) float32 world coordinates
+LANDMARK_MAGIC = b'GTLM'
+LANDMARK_VERSION = 1
+LANDMARK_HEADER = struct.Struct('<4sBBHQd')
+LANDMARK_COUNT = 33
+LANDMARK_BODY = struct.Struct(f'<{LANDMARK_COUNT * 3}f')
+
+def pack_landmarks(camera_id, seq, timestamp, landmarks):
+    """Pack a landmark list (.landmark[i].x/y/z) into a ~420 byte packet"""
+    coords = []
+    for i in range(LANDMARK_COUNT):
+        landmark = landmarks.landmark[i]
+        coords.extend((landmark.x, landmark.y, landmark.z))
+    header = LANDMARK_HEADER.pack(LANDMARK_MAGIC, LANDMARK_VERSION, LANDMARK_COUNT, camera_id, seq, timestamp)
+    return header + LANDMARK_BODY.pack(*coords)
+
+class LandmarkTap:
+    """Fire-and-forget UDP sender of landmark packets for one camera"""
+    def __init__(self, host, port, camera_id):
+        self.address = (host, port)
+        self.camera_id = camera_id
+        self.seq = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, landmarks, timestamp=None):
+        """`timestamp` is the frame's capture time, so consumers can align landmarks with video"""
+        self.seq += 1
+        if timestamp is None:
+            timestamp = time.time()
+        packet = pack_landmarks(self.camera_id, self.seq, timestamp, landmarks)
+        try:
+            self.sock.sendto(packet, self.address)
+        except OSError:
+            pass  # Tap is best effort, never stalls tracking
+
+    def close(self):
+        self.sock.close()
@@ -1,5 +1,8 @@
 # UDP server for multiple camera feeds
 from body import BodyThread
+from output_scheduler import OutputScheduler
+from subscribers import SubscriberRegistry
+from profiler import SamplingProfiler
 import time
 import global_vars
 import signal
@@ -26,8 +29,42 @@ def signal_handler(sig, frame):
     print("✅ All threads stopped. Exiting...")
     sys.exit(0)
 
+def start_profile(seconds=None, rate=None, trace_allocations=None):
+    """Capture a sampling profile of all threads in the background"""
+    profiler = SamplingProfiler.capture(
+        global_vars.PROFILE_SECONDS if seconds is None else seconds,
+        global_vars.PROFILE_RATE if rate is None else rate,
+        global_vars.PROFILE_DIR,
+        global_vars.PROFILE_TRACEMALLOC if trace_allocations is None else trace_allocations
+    )
+    if profiler is None:
+        print("⚠️ Profile already running")
+    return profiler
+
+def profile_signal_handler(sig, frame):
+    start_profile()
+
+def profile_control_op(request):
+    # The control port is unauthenticated: non-positive values are rejected, large ones capped
+    seconds = request.get("seconds")
+    rate = request.get("rate")
+    trace_allocations = request.get("tracemalloc")
+    try:
+        profiler = start_profile(
+            None if seconds is None else float(seconds),
+            None if rate is None else float(rate),
+            None if trace_allocations is None else bool(trace_allocations)
+        )
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    if profiler is None:
+        return {"ok": False, "error": "profile already running"}
+    return {"ok": True, "output": profiler.output_path, "seconds": profiler.seconds, "rate": profiler.rate}
+
 # Register signal handler
 signal.signal(signal.SIGINT, signal_handler)
+if hasattr(signal, 'SIGUSR1'):  # Not available on Windows, use the control port there
+    signal.signal(signal.SIGUSR1, profile_signal_handler)
 
 print(f"=== MediaPipe Body Processing Server ===")
 print(f"Camera input host: {global_vars.HOST}")
@@ -39,12 +76,22 @@ print()
 threads = []
 started_threads = 0
 
+subscribers = None
+if global_vars.SUBSCRIBER_CONTROL_PORT:
+    formats = ('multiplex',) if global_vars.MULTIPLEX_OUTPUT_PORT else ('text',)
+    subscribers = SubscriberRegistry(global_vars.HOST, global_vars.SUBSCRIBER_CONTROL_PORT, formats, global_vars.MULTICAST_GROUP)
+    subscribers.add_control_op("profile", profile_control_op)
+    subscribers.start()
+
 for input_port in INPUT_PORTS:
     output_port = input_port + 33
-    print(f"Starting thread: Camera feed {input_port} -> Unity {global_vars.OUTPUT_HOST}:{output_port}")
+    if global_vars.MULTIPLEX_OUTPUT_PORT:
+        print(f"Starting thread: Camera feed {input_port} -> multiplexed output")
+    else:
+        print(f"Starting thread: Camera feed {input_port} -> Unity {global_vars.OUTPUT_HOST}:{output_port}")
     
     try:
-        thread = BodyThread(input_port, output_port)
+        thread = BodyThread(input_port, output_port, subscribers)
         thread.start()
         threads.append(thread)
         started_threads += 1
@@ -52,6 +99,19 @@ for input_port in INPUT_PORTS:
     except Exception as e:
         print(f"❌ Failed to start thread for port {input_port}: {e}")
 
+if global_vars.OUTPUT_RATE or global_vars.MULTIPLEX_OUTPUT_PORT:
+    multiplex_address = None
+    if global_vars.MULTIPLEX_OUTPUT_PORT:
+        multiplex_address = (global_vars.OUTPUT_HOST, global_vars.MULTIPLEX_OUTPUT_PORT)
+        print(f"Multiplexing all cameras -> Unity {global_vars.OUTPUT_HOST}:{global_vars.MULTIPLEX_OUTPUT_PORT}")
+    scheduler = OutputScheduler(list(threads), global_vars.OUTPUT_RATE or global_vars.DEFAULT_MULTIPLEX_RATE,
+                                global_vars.PREDICTION_HORIZON, multiplex_address, subscribers)
+    scheduler.start()
+    threads.append(scheduler)
+
+if subscribers:
+    threads.append(subscribers)
+
 print(f"\n🚀 {started_threads}/{len(INPUT_PORTS)} threads started successfully!")
 print("Press Ctrl+C to stop all threads gracefully...")
 
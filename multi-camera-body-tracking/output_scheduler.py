@@ -0,0 +1,116 @@
+import socket
+import struct
+import threading
+import time
+import numpy as np
+import global_vars
+from body import format_landmark_points
+
+# Debug prefix for easy removal
+DEBUG_PREFIX = "DEBUG_"
+
+# Multiplexed output: one datagram per tick holding every camera's pose
+# (must match avatar-processing-last/Assets/Scripts/MultiplexedServerUDP.cs):
+#   magic 'GTMX', version, camera count, tick sequence, send timestamp
+#   per camera: camera id (input port), flags, landmark count, sample timestamp,
+#               then count * (x, y, z) float32 (count is 0 when not valid)
+MULTIPLEX_MAGIC = b'GTMX'
+MULTIPLEX_VERSION = 1
+MULTIPLEX_HEADER = struct.Struct('<4sBBId')
+MULTIPLEX_ENTRY = struct.Struct('<HBBd')
+FLAG_VALID = 1
+FLAG_PREDICTED = 2  # Extrapolated past the newest sample
+LANDMARK_COUNT = 33
+
+def pack_multiplexed(seq, timestamp, entries):
+    """entries: (camera id, sample timestamp, 33x3 points or None, predicted)"""
+    parts = [MULTIPLEX_HEADER.pack(MULTIPLEX_MAGIC, MULTIPLEX_VERSION, len(entries), seq, timestamp)]
+    for camera_id, sample_time, points, predicted in entries:
+        if points is None:
+            parts.append(MULTIPLEX_ENTRY.pack(camera_id, 0, 0, sample_time or 0.0))
+            continue
+        flags = FLAG_VALID | (FLAG_PREDICTED if predicted else 0)
+        parts.append(MULTIPLEX_ENTRY.pack(camera_id, flags, LANDMARK_COUNT, sample_time))
+        parts.append(np.asarray(points, dtype='<f4').tobytes())
+    return b"".join(parts)
+
+class OutputScheduler(threading.Thread):
+    """Sends every body thread's pose to Unity on a fixed clock
+
+    Inference finishes at an irregular rate per camera; on each tick the
+    scheduler asks each smoother for the pose at `now + horizon`, which is
+    interpolated between the last two samples or extrapolated along their
+    velocity (capped), so Unity receives evenly spaced updates. In multiplexed
+    mode every camera goes out in a single datagram, a consistent snapshot.
+    """
+    def __init__(self, body_threads, rate, horizon=0.0, multiplex_address=None, subscribers=None):
+        super().__init__(name="OutputScheduler")
+        self.body_threads = body_threads
+        self.subscribers = subscribers
+        # Set to (host, port) to send all cameras in one datagram instead of one message each
+        self.multiplex_address = multiplex_address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if multiplex_address else None
+        self.period = 1.0 / rate
+        self.horizon = horizon
+        self.should_stop = False
+        self.daemon = True
+        self.ticks = 0
+        self.ticks_sent = 0
+        self.late_ticks = 0
+
+    def run(self):
+        print(f"{DEBUG_PREFIX}Output scheduler running at {1.0 / self.period:.0f} Hz, horizon {self.horizon * 1000:.0f}ms")
+        next_tick = time.perf_counter()
+        last_stats_time = time.time()
+
+        while not self.should_stop and not global_vars.KILL_THREADS:
+            now = time.time()
+            target_time = now + self.horizon
+            if self.sock:
+                self.send_multiplexed(now, target_time)
+            else:
+                for thread in self.body_threads:
+                    points = thread.smoother.predict(target_time)
+                    if points is not None:
+                        thread.send_data(format_landmark_points(points))
+            self.ticks += 1
+
+            next_tick += self.period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (GIL contention), skip missed ticks instead of bursting
+                self.late_ticks += 1
+                next_tick = time.perf_counter()
+
+            current_time = time.time()
+            if current_time - last_stats_time >= 5:
+                print(f"{DEBUG_PREFIX}Output scheduler: {self.ticks / (current_time - last_stats_time):.1f} Hz, late ticks: {self.late_ticks}")
+                self.ticks = 0
+                self.late_ticks = 0
+                last_stats_time = current_time
+
+        if self.sock:
+            self.sock.close()
+        print(f"{DEBUG_PREFIX}Output scheduler stopped")
+
+    def send_multiplexed(self, now, target_time):
+        entries = []
+        for thread in self.body_threads:
+            smoother = thread.smoother
+            points = smoother.predict(target_time)
+            sample_time = smoother.sample_time
+            predicted = points is not None and sample_time is not None and target_time > sample_time
+            entries.append((thread.input_port, sample_time, points, predicted))
+        packet = pack_multiplexed(self.ticks_sent & 0xFFFFFFFF, now, entries)
+        try:
+            self.sock.sendto(packet, self.multiplex_address)
+            self.ticks_sent += 1
+        except OSError as e:
+            print(f"{DEBUG_PREFIX}Multiplexed send error to {self.multiplex_address}: {e}")
+        if self.subscribers:
+            self.subscribers.publish_multiplexed(packet, self.multiplex_address[1])
+
+    def stop(self):
+        self.should_stop = True
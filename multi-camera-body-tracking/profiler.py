@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Debug prefix for easy removal
+DEBUG_PREFIX = "DEBUG_"
+
+TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_TOP = 50
+MAX_PROFILE_SECONDS = 300
+MAX_PROFILE_RATE = 1000  # Hz
+
+def profile_limits(seconds, rate):
+    """Validated (seconds, rate), capped so every capture ends and stays cheap"""
+    if not (seconds > 0 and rate > 0):  # Also rejects NaN
+        raise ValueError(f"seconds and rate must be positive, got {seconds} and {rate}")
+    return min(seconds, MAX_PROFILE_SECONDS), min(rate, MAX_PROFILE_RATE)
+
+class SamplingProfiler(threading.Thread):
+    """Samples every thread's stack for a while and writes collapsed stacks
+
+    Output is one line per distinct stack, `thread;outer;...;inner count`, the
+    format flamegraph.pl and speedscope read. Each stack is rooted at its
+    thread name (BodyThread-62700, UDPFrameReceiver-62700, ...), so every
+    thread gets its own track. Sampling is sys._current_frames() at `rate`
+    Hz, cheap enough for the live server.
+    """
+    _active = None
+    _active_lock = threading.Lock()
+
+    def __init__(self, seconds, rate, output_dir, trace_allocations=False):
+        super().__init__()
+        self.daemon = True
+        self.name = "SamplingProfiler"
+        self.seconds, self.rate = profile_limits(seconds, rate)
+        self.interval = 1.0 / self.rate
+        self.trace_allocations = trace_allocations
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_path = os.path.join(output_dir, f"profile_{stamp}.collapsed")
+        self.allocations_path = os.path.join(output_dir, f"allocations_{stamp}.txt")
+        self.stacks = Counter()
+        self.samples = 0
+
+    @classmethod
+    def capture(cls, seconds, rate, output_dir, trace_allocations=False):
+        """Start a capture unless one is running, returns the profiler or None"""
+        with cls._active_lock:
+            if cls._active and cls._active.is_alive():
+                return None
+            cls._active = cls(seconds, rate, output_dir, trace_allocations)
+            cls._active.start()
+            return cls._active
+
+    def run(self):
+        print(f"{DEBUG_PREFIX}Profiling {self.seconds}s at {self.rate:.0f} Hz -> {self.output_path}")
+        started_tracemalloc = False
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            started_tracemalloc = True
+
+        own_ident = threading.get_ident()
+        end_time = time.perf_counter() + self.seconds
+        next_sample = time.perf_counter()
+        while next_sample < end_time:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    self.stacks[self.collapse(names.get(ident, f"thread-{ident}"), frame)] += 1
+            self.samples += 1
+
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        self.write_stacks()
+        if self.trace_allocations:
+            self.write_allocations(tracemalloc.take_snapshot())
+            if started_tracemalloc:
+                tracemalloc.stop()
+        print(f"{DEBUG_PREFIX}Profile written: {self.output_path} ({self.samples} samples)")
+
+    @staticmethod
+    def collapse(thread_name, frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+    def write_stacks(self):
+        with open(self.output_path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_allocations(self, snapshot):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        with open(self.allocations_path, 'w') as f:
+            f.write(f"Top {TRACEMALLOC_TOP} allocation sites after {self.seconds}s\n")
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
+        print(f"{DEBUG_PREFIX}Allocation snapshot written: {self.allocations_path}")
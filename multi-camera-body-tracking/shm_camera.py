@@ -0,0 +1,131 @@
+import struct
+import time
+import numpy as np
+import global_vars
+from multiprocessing import shared_memory, resource_tracker
+
+# Same-host camera transport: raw BGR frames at processing resolution in a
+# shared-memory ring, no JPEG encode/decode and no UDP.
+# Ring layout: [ring header][slot 0][slot 1]...   Slot layout: [slot header][BGR pixels]
+RING_HEADER = struct.Struct('<QIII')  # write_seq, slot_count, width, height
+SLOT_HEADER = struct.Struct('<Qd')    # seq, capture timestamp
+DEFAULT_SLOT_COUNT = 3
+
+def ring_name(input_port):
+    return f"body_cam_{input_port}"
+
+class SharedCameraRing:
+    """Single-writer ring of fixed-size BGR frames
+
+    The body thread creates (and owns) the ring for its input port, the camera
+    sender attaches to it and resizes frames to the ring's resolution. Slots
+    carry the sequence number of their frame and are re-checked after copying,
+    so a frame overwritten mid-read is skipped instead of torn.
+    """
+    def __init__(self, input_port, create=False, width=320, height=240, slot_count=DEFAULT_SLOT_COUNT):
+        name = ring_name(input_port)
+        if create:
+            size = RING_HEADER.size + slot_count * (SLOT_HEADER.size + width * height * 3)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a crashed run
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, slot_count, width, height)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Attaching must not hand the segment to this process' resource tracker,
+            # which would unlink it from under the owner when we exit
+            try:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            except Exception:
+                pass
+            _, slot_count, width, height = RING_HEADER.unpack_from(self.shm.buf, 0)
+
+        self.owner = create
+        self.slot_count = slot_count
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.slot_size = SLOT_HEADER.size + self.frame_size
+
+    @property
+    def write_seq(self):
+        return RING_HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def slot_offset(self, seq):
+        return RING_HEADER.size + (seq % self.slot_count) * self.slot_size
+
+    def slot_frame(self, offset):
+        return np.ndarray((self.height, self.width, 3), dtype=np.uint8,
+                          buffer=self.shm.buf, offset=offset + SLOT_HEADER.size)
+
+    def write(self, frame, timestamp=None):
+        """Publish a BGR frame of exactly width x height"""
+        buf = self.shm.buf
+        seq = self.write_seq + 1
+        offset = self.slot_offset(seq)
+
+        # Invalidate slot while it is being rewritten
+        SLOT_HEADER.pack_into(buf, offset, 0, 0.0)
+        self.slot_frame(offset)[:] = frame
+        SLOT_HEADER.pack_into(buf, offset, seq, timestamp or time.time())
+
+        RING_HEADER.pack_into(buf, 0, seq, self.slot_count, self.width, self.height)
+        return seq
+
+    def read_latest(self, after_seq=0):
+        """Copy of the newest frame as (seq, frame, timestamp), None if nothing newer than after_seq"""
+        seq = self.write_seq
+        if seq <= after_seq:
+            return None
+        offset = self.slot_offset(seq)
+        slot_seq, timestamp = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if slot_seq != seq:
+            return None
+        frame = self.slot_frame(offset).copy()
+
+        # Writer lapped us while copying
+        if SLOT_HEADER.unpack_from(self.shm.buf, offset)[0] != seq:
+            return None
+        return seq, frame, timestamp
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+class SharedFrameReceiver:
+    """Drop-in for UDPFrameReceiver when the camera runs on this machine"""
+    def __init__(self, port, width, height):
+        self.port = port
+        self.ring = SharedCameraRing(port, create=True, width=width, height=height)
+        self.last_seq = 0
+        self.last_timestamp = None
+        self.isRunning = False
+        self.closed = False
+        print(f"{global_vars.DEBUG_PREFIX}Shared-memory receiver initialized for port {self.port} ({width}x{height})")
+
+    def start(self):
+        self.isRunning = True
+
+    def get_frame(self):
+        """Newest frame not returned yet, already at processing resolution"""
+        latest = self.ring.read_latest(self.last_seq)
+        if latest is None:
+            return None
+        self.last_seq, frame, self.last_timestamp = latest
+        return frame
+
+    def stop(self):
+        self.isRunning = False
+        if not self.closed:
+            self.closed = True
+            self.ring.close()
+            print(f"{global_vars.DEBUG_PREFIX}Shared-memory receiver stopped on port {self.port}")
@@ -0,0 +1,183 @@
+import json
+import math
+import socket
+import threading
+import time
+import global_vars
+
+# Debug prefix for easy removal
+DEBUG_PREFIX = "DEBUG_"
+
+# Control protocol (one JSON object per datagram to the control port, reply on the same socket):
+#   {"op": "subscribe", "cameras": [62700, 62701] or "all", "port": 62733,
+#    "format": "text" | "multiplex", "lease": 10}
+#       -> {"ok": true, "lease": 10}   re-send before the lease ends as heartbeat
+#   {"op": "unsubscribe", "port": 62733}  -> {"ok": true}
+# Data goes to the subscriber's IP at "port" (default: the control source port).
+DEFAULT_LEASE = 10.0
+MAX_LEASE = 60.0
+FORMATS = ('text', 'multiplex')
+
+class Subscription:
+    def __init__(self, address, cameras, data_format, lease, now):
+        self.address = address
+        self.update(cameras, data_format, lease, now)
+
+    def update(self, cameras, data_format, lease, now):
+        self.cameras = cameras  # None for all cameras
+        self.format = data_format
+        self.expires = now + lease
+
+    def wants(self, camera_id):
+        return self.cameras is None or camera_id in self.cameras
+
+class SubscriberRegistry(threading.Thread):
+    """Extra landmark consumers registered at runtime, next to OUTPUT_HOST
+
+    Consumers subscribe to cameras over a small UDP control handshake and keep
+    their lease alive by re-subscribing. Each output message is serialized
+    once and the same buffer is sent to every matching subscriber; with a
+    multicast group configured it is also sent once to the group, so any
+    number of LAN consumers cost a single send.
+    """
+    def __init__(self, host, control_port, formats=FORMATS, multicast_group=None, multicast_ttl=1):
+        super().__init__(name="SubscriberRegistry")
+        self.formats = formats  # What the current output mode produces
+        self.daemon = True
+        self.should_stop = False
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # (ip, port) -> Subscription
+        self.control_ops = {}  # Extra control commands, op -> handler(request) -> reply
+        self.multicast_group = multicast_group
+
+        self.control_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.control_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.control_sock.settimeout(1.0)
+        self.control_sock.bind((host, control_port))
+
+        self.send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if multicast_group:
+            self.send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, multicast_ttl)
+
+        self.packets_sent = 0
+        print(f"{DEBUG_PREFIX}Subscriber control on {host}:{control_port}"
+              + (f", multicast group {multicast_group}" if multicast_group else ""))
+
+    def run(self):
+        last_stats_time = time.time()
+        while not self.should_stop and not global_vars.KILL_THREADS:
+            try:
+                data, addr = self.control_sock.recvfrom(4096)
+                reply = self.handle_control(data, addr)
+                self.control_sock.sendto(json.dumps(reply).encode('utf-8'), addr)
+            except socket.timeout:
+                pass
+            except Exception as e:
+                print(f"{DEBUG_PREFIX}Subscriber control error: {e}")
+
+            current_time = time.time()
+            self.expire(current_time)
+            if current_time - last_stats_time >= 10:
+                with self.lock:
+                    count = len(self.subscriptions)
+                if count:
+                    print(f"{DEBUG_PREFIX}Subscribers: {count}, packets sent: {self.packets_sent}")
+                last_stats_time = current_time
+
+        self.control_sock.close()
+        self.send_sock.close()
+
+    def handle_control(self, data, addr):
+        try:
+            request = json.loads(data.decode('utf-8'))
+            return self.handle_request(request, addr)
+        except (UnicodeDecodeError, ValueError, TypeError, AttributeError) as e:
+            return {"ok": False, "error": f"invalid request: {e}"}
+
+    def handle_request(self, request, addr):
+        op = request.get("op")
+        address = (addr[0], int(request.get("port", addr[1])))
+        now = time.time()
+
+        if op == "subscribe":
+            cameras = request.get("cameras", "all")
+            if cameras == "all":
+                cameras = None
+            elif isinstance(cameras, list) and all(type(camera) is int for camera in cameras):
+                cameras = set(cameras)
+            else:
+                return {"ok": False, "error": "cameras must be \"all\" or a list of camera ports"}
+            data_format = request.get("format", self.formats[0])
+            if data_format not in self.formats:
+                return {"ok": False, "error": f"format {data_format} not available, use one of {list(self.formats)}"}
+            lease = float(request.get("lease", DEFAULT_LEASE))
+            if not (math.isfinite(lease) and lease > 0):  # A NaN lease would never expire
+                return {"ok": False, "error": f"lease must be a positive number of seconds, got {lease}"}
+            lease = min(lease, MAX_LEASE)
+
+            with self.lock:
+                subscription = self.subscriptions.get(address)
+                if subscription:
+                    subscription.update(cameras, data_format, lease, now)
+                else:
+                    self.subscriptions[address] = Subscription(address, cameras, data_format, lease, now)
+                    print(f"{DEBUG_PREFIX}Subscriber {address[0]}:{address[1]} added ({data_format}, cameras: {request.get('cameras', 'all')})")
+            return {"ok": True, "lease": lease}
+
+        if op == "unsubscribe":
+            with self.lock:
+                removed = self.subscriptions.pop(address, None)
+            if removed:
+                print(f"{DEBUG_PREFIX}Subscriber {address[0]}:{address[1]} removed")
+            return {"ok": True}
+
+        handler = self.control_ops.get(op)
+        if handler:
+            return handler(request)
+
+        return {"ok": False, "error": f"unknown op {op}"}
+
+    def add_control_op(self, op, handler):
+        self.control_ops[op] = handler
+
+    def expire(self, now):
+        with self.lock:
+            expired = [address for address, subscription in self.subscriptions.items() if subscription.expires < now]
+            for address in expired:
+                del self.subscriptions[address]
+        for address in expired:
+            print(f"{DEBUG_PREFIX}Subscriber {address[0]}:{address[1]} lease expired")
+
+    def targets(self, data_format, camera_id=None):
+        with self.lock:
+            return [
+                subscription.address for subscription in self.subscriptions.values()
+                if subscription.format == data_format and (camera_id is None or subscription.wants(camera_id))
+            ]
+
+    def send(self, payload, targets):
+        for address in targets:
+            try:
+                self.send_sock.sendto(payload, address)
+                self.packets_sent += 1
+            except OSError:
+                pass  # Subscriber went away, its lease will run out
+
+    def publish_text(self, camera_id, output_port, message):
+        """Per-camera text message (same bytes as ClientUDP sends to OUTPUT_HOST)"""
+        targets = self.targets('text', camera_id)
+        if self.multicast_group:
+            targets.append((self.multicast_group, output_port))
+        if targets:
+            self.send(f"{message}<EOM>".encode('utf-8'), targets)
+
+    def publish_multiplexed(self, packet, port):
+        """All-camera datagram from the OutputScheduler"""
+        targets = self.targets('multiplex')
+        if self.multicast_group:
+            targets.append((self.multicast_group, port))
+        if targets:
+            self.send(packet, targets)
+
+    def stop(self):
+        self.should_stop = True